@@ -1,14 +1,108 @@
 import os
+import re
 import json
 import uuid
 import streamlit as st
 from dotenv import load_dotenv
-from core.director import run_pipeline
+from core.jobs import JobRunner, ACTIVE_STATES, resubmit_kwargs
+from core.director import regenerate_scene
+from tools.genai_client import get_client
+from tools.asset_cache import AssetCache
+from tools.response_cache import ResponseCache
+from tools.ffmpeg_render import RENDER_PROFILES, DEFAULT_PROFILE
+from tools.metrics import serve_metrics, METRICS_PORT_ENV
+from tools.retention import finalize_run, list_runs, ensure_index
 
 load_dotenv()
 
 st.set_page_config(page_title="Stage 1 Lesson Builder", layout="wide")
 
+OUTPUT_ROOT = "outputs"
+CACHE_DIR = os.getenv("UNFOLD_CACHE_DIR", "cache")
+DONE_STATES = ("done", "reused", "cached", "fallback", "skipped")
+
+@st.cache_resource
+def job_runner() -> JobRunner:
+    runner = JobRunner(int(os.getenv("UNFOLD_MAX_JOBS", "2")))
+    runner.on_done = lambda out_dir: finalize_run(out_dir, active=tuple(runner.active_ids()))
+    return runner
+
+@st.cache_resource
+def shared_resources(api_key: str) -> dict:
+    return {
+        "genai_client": get_client(api_key),
+        "asset_cache": AssetCache(os.path.join(CACHE_DIR, "assets")),
+        "response_cache": ResponseCache(os.path.join(CACHE_DIR, "responses.sqlite"))
+    }
+
+@st.cache_resource
+def metrics_server():
+    return serve_metrics(int(os.environ[METRICS_PORT_ENV])) if os.getenv(METRICS_PORT_ENV) else None
+
+metrics_server()
+
+@st.cache_resource
+def runs_index_ready(root: str) -> bool:
+    ensure_index(root)
+    return True
+
+def run_dir(run_id: str) -> str:
+    return os.path.join(OUTPUT_ROOT, f"run_{run_id}")
+
+def show_progress(status: dict):
+    stages = status.get("stages", {})
+    scenes = sorted({k.split(".")[0] for k in stages if k.startswith("scene_")})
+    expected = 3 + len(scenes) * 3
+    finished = sum(1 for v in stages.values() if v.get("status") in DONE_STATES)
+    st.progress(min(1.0, finished / expected), text=f"{status['state']}: {status.get('current') or 'waiting for a free slot'}")
+    cols = st.columns(3)
+    for col, name in zip(cols, ("plan", "script", "render")):
+        col.metric(name.capitalize(), stages.get(name, {}).get("status", "pending"))
+    if stages.get("hls", {}).get("path"):
+        st.write(f"HLS preview playlist: {stages['hls']['path']} (serve its folder over HTTP to watch finished scenes now)")
+    if scenes:
+        st.table([
+            {
+                "scene": sc,
+                "image": stages.get(f"{sc}.image", {}).get("status", "pending"),
+                "audio": stages.get(f"{sc}.audio", {}).get("status", "pending"),
+                "segment": stages.get(f"{sc}.render", {}).get("status", "pending")
+            }
+            for sc in scenes
+        ])
+
+@st.fragment(run_every=1.0)
+def progress_panel(run_id: str):
+    status = job_runner().status(run_id, run_dir(run_id))
+    if not status or status["state"] not in ACTIVE_STATES:
+        st.rerun()
+    show_progress(status)
+
+def show_result(out_dir: str):
+    with open(os.path.join(out_dir, "result.json"), "r", encoding="utf-8") as f:
+        result = json.load(f)
+
+    st.subheader("Plan")
+    st.code(json.dumps(result["plan"], indent=2), language="json")
+
+    st.subheader("Script")
+    st.code(json.dumps(result["script"], indent=2), language="json")
+
+    st.subheader("Artifacts")
+    st.write(f"Output folder: {out_dir}")
+    if result.get("captions_srt"):
+        st.write(f"Captions: {result['captions_srt']}")
+    if result.get("captions_vtt"):
+        st.write(f"WebVTT captions: {result['captions_vtt']}")
+    if result.get("hls_playlist"):
+        st.write(f"HLS playlist: {result['hls_playlist']}")
+    if result.get("final_video_path") and os.path.exists(result["final_video_path"]):
+        st.video(result["final_video_path"])
+    elif result.get("render_error"):
+        st.error(f"Render failed: {result['render_error']}")
+    else:
+        st.info("Video rendering disabled (FFmpeg not available). Content-only mode is active.")
+
 st.title("Stage 1: Kids Lesson Video (Storyboard)")
 
 col1, col2, col3, col4 = st.columns(4)
@@ -23,51 +117,130 @@ with col4:
 
 prompt = st.text_area("Prompt", value="Teach triangles to an 8 year old in a super heroes way", height=120)
 
-mode_col1, mode_col2, mode_col3 = st.columns(3)
+mode_col1, mode_col2, mode_col3, mode_col4, mode_col5 = st.columns(5)
 with mode_col1:
     gen_images = st.checkbox("Generate images", value=True)
 with mode_col2:
     gen_audio = st.checkbox("Generate audio", value=True)
 with mode_col3:
     burn_subs = st.checkbox("Burn subtitles", value=True)
+with mode_col4:
+    soft_subs = st.checkbox("Soft subtitles (no re-encode)", value=False)
+with mode_col5:
+    single_pass = st.checkbox("Single-pass render", value=False)
 
-if st.button("Generate"):
+opt_col1, opt_col2, opt_col3, opt_col4 = st.columns(4)
+with opt_col1:
+    streaming = st.checkbox("Streaming pipeline (render scenes as assets land)", value=False)
+    stream_script = st.checkbox("Stream script from model (start media per parsed scene)", value=False)
+    hls = st.checkbox("HLS preview (playlist grows as scenes render)", value=False)
+with opt_col2:
+    fresh = st.checkbox("Bypass response cache (fresh plan and script)", value=False)
+    rebuild = st.checkbox("Rebuild every stage (ignore previous outputs)", value=False)
+with opt_col3:
+    synthetic_placeholders = st.checkbox("Synthetic placeholders (no fallback files)", value=True)
+with opt_col4:
+    render_profile = st.selectbox("Render profile", list(RENDER_PROFILES), index=list(RENDER_PROFILES).index(DEFAULT_PROFILE))
+
+def require_api_key() -> str:
     api_key = os.getenv("GEMINI_API_KEY", "").strip()
     if not api_key:
         st.error("Missing GEMINI_API_KEY. Add it to your .env file.")
         st.stop()
+    return api_key
 
-    run_id = str(uuid.uuid4())[:8]
-    out_dir = os.path.join("outputs", f"run_{run_id}")
-    os.makedirs(out_dir, exist_ok=True)
-
-    with st.spinner("Building lesson..."):
-        result = run_pipeline(
-            user_prompt=prompt,
-            age=age,
-            difficulty=difficulty,
-            duration_sec=duration,
-            theme=theme,
-            out_dir=out_dir,
-            gen_images=gen_images,
-            gen_audio=gen_audio,
-            burn_subs=burn_subs,
-            api_key=api_key
-        )
-
-    st.success("Done")
+def resubmit(run_id: str, status: dict, label: str, **overrides):
+    request = status.get("request") or {}
+    if not request:
+        return
+    if st.button(label):
+        api_key = require_api_key()
+        job_runner().submit(run_id, run_dir(run_id), **resubmit_kwargs(request, **overrides), api_key=api_key, **shared_resources(api_key))
+        st.rerun()
 
-    st.subheader("Plan")
-    st.code(json.dumps(result["plan"], indent=2), language="json")
+def regenerate_panel(run_id: str, status: dict):
+    out_dir = run_dir(run_id)
+    with open(os.path.join(out_dir, "result.json"), "r", encoding="utf-8") as f:
+        scenes = json.load(f)["script"]["scenes"]
+    with st.expander("Regenerate one scene"):
+        index = st.selectbox("Scene", [s["index"] for s in scenes])
+        current = next(s for s in scenes if s["index"] == index)
+        narration = st.text_area("Narration", value=current["narration"], key=f"narration_{index}")
+        visual_prompt = st.text_area("Visual prompt", value=current["visual_prompt"], key=f"visual_{index}")
+        notes = st.text_input("Or ask the model to rewrite it (leave the fields unchanged)", value="")
+        if st.button("Regenerate scene"):
+            api_key = require_api_key()
+            overrides = {k: v for k, v in (("narration", narration), ("visual_prompt", visual_prompt)) if v != current[k]}
+            resources = shared_resources(api_key)
+            job_runner().submit(
+                run_id, out_dir, target=regenerate_scene, request=status.get("request"),
+                index=index, overrides=overrides, notes=notes or None, api_key=api_key,
+                genai_client=resources["genai_client"], asset_cache=resources["asset_cache"]
+            )
+            st.rerun()
 
-    st.subheader("Script")
-    st.code(json.dumps(result["script"], indent=2), language="json")
+if st.button("Generate"):
+    api_key = require_api_key()
 
-    st.subheader("Artifacts")
-    st.write(f"Output folder: {out_dir}")
-    if result.get("captions_srt"):
-        st.write(f"Captions: {result['captions_srt']}")
-    if result.get("final_video_path") and os.path.exists(result["final_video_path"]):
-        st.video(result["final_video_path"])
+    run_id = str(uuid.uuid4())[:8]
+    job_runner().submit(
+        run_id,
+        run_dir(run_id),
+        user_prompt=prompt,
+        age=age,
+        difficulty=difficulty,
+        duration_sec=duration,
+        theme=theme,
+        gen_images=gen_images,
+        gen_audio=gen_audio,
+        burn_subs=burn_subs,
+        api_key=api_key,
+        single_pass=single_pass,
+        soft_subs=soft_subs,
+        cache_dir=CACHE_DIR,
+        fresh=fresh,
+        rebuild=rebuild,
+        streaming=streaming,
+        synthetic_placeholders=synthetic_placeholders,
+        stream_script=stream_script,
+        render_profile=render_profile,
+        hls=hls,
+        **shared_resources(api_key)
+    )
+    st.query_params["run"] = run_id
+
+runs_index_ready(OUTPUT_ROOT)
+recent = list_runs(OUTPUT_ROOT, limit=20)
+if recent:
+    with st.expander("Recent runs"):
+        st.table([
+            {"run": r["run_id"], "topic": r["topic"], "state": r["state"], "video": bool(r["final_video"]), "MB": round(r["bytes"] / 1e6, 1)}
+            for r in recent
+        ])
+
+run_id = st.text_input("Run id (reconnect to a previous or in-flight run)", value=st.query_params.get("run", ""))
+if run_id and not re.fullmatch(r"[A-Za-z0-9_-]{1,64}", run_id):
+    st.error("Invalid run id.")
+elif run_id:
+    st.query_params["run"] = run_id
+    out_dir = run_dir(run_id)
+    status = job_runner().status(run_id, out_dir)
+    st.caption(f"Run {run_id} - {job_runner().active_count()} job(s) in flight")
+    if status is None:
+        st.warning("No run with that id.")
+    elif status["state"] in ACTIVE_STATES:
+        progress_panel(run_id)
+    elif status["state"] == "done":
+        st.success("Done")
+        rerender_profile = st.selectbox("Re-render this run with profile", list(RENDER_PROFILES), index=list(RENDER_PROFILES).index("final"))
+        resubmit(run_id, status, "Re-render (reuses plan, script and media)", render_profile=rerender_profile)
+        regenerate_panel(run_id, status)
+        show_result(out_dir)
+    elif status["state"] == "error":
+        show_progress(status)
+        st.error(status.get("error") or "Run failed")
+        resubmit(run_id, status, "Retry (finished stages are reused)")
     else:
-        st.info("Video rendering disabled (FFmpeg not available). Content-only mode is active.")
+        show_progress(status)
+        st.warning("This run was interrupted before it finished (the server restarted).")
+        resubmit(run_id, status, "Resume (finished stages are reused)")
@@ -0,0 +1,214 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dotenv import load_dotenv
+from core.director import run_pipeline
+from core.variants import run_variants, variant_id
+from tools.genai_client import set_api_concurrency, set_rate_limit, RATE_LIMITS
+from tools.ffmpeg_render import set_max_concurrent_jobs
+from tools.metrics import serve_metrics, write_metrics
+from tools.retention import retention_policy, prune_intermediates, update_index, enforce_retention, ensure_index
+
+DEFAULTS = {
+    "age": 8,
+    "difficulty": 3,
+    "duration_sec": 90,
+    "theme": "Superheroes",
+    "gen_images": True,
+    "gen_audio": True,
+    "burn_subs": True
+}
+PIPELINE_OPTIONS = ("single_pass", "soft_subs", "streaming", "fresh", "rebuild", "render_profile", "hls")
+
+def _run_id(req: dict) -> str:
+    rid = str(req.get("run_id") or "").strip()
+    if rid:
+        return rid
+    payload = json.dumps(req, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:12]
+
+def _iter_requests(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                req = json.loads(line)
+            except Exception as e:
+                yield line_no, None, f"Bad JSON: {e}"
+                continue
+            if not isinstance(req, dict):
+                yield line_no, None, "Request must be a JSON object"
+                continue
+            yield line_no, req, None
+
+def _load_checkpoint(path: str) -> set:
+    if not os.path.exists(path):
+        return set()
+    with open(path, "r", encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
+def _percentile(values: list, q: float):
+    if not values:
+        return None
+    vals = sorted(values)
+    k = (len(vals) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(vals) - 1)
+    return round(vals[lo] + (vals[hi] - vals[lo]) * (k - lo), 3)
+
+def run_job(req: dict, run_id: str, out_root: str, api_key: str, cache_dir: str = None) -> dict:
+    out_dir = os.path.join(out_root, f"run_{run_id}")
+    kwargs = {k: req.get(k, v) for k, v in DEFAULTS.items()}
+    if "duration" in req and "duration_sec" not in req:
+        kwargs["duration_sec"] = req["duration"]
+    kwargs.update({k: req[k] for k in PIPELINE_OPTIONS if k in req})
+    started = time.time()
+    t0 = time.perf_counter()
+    record = {"run_id": run_id, "out_dir": out_dir, "started_at": started}
+    try:
+        prompt = req.get("prompt") or req.get("user_prompt")
+        if not prompt:
+            raise ValueError("Missing prompt")
+        if req.get("variants"):
+            summary = run_variants(
+                user_prompt=prompt,
+                variants=req["variants"],
+                out_root=out_dir,
+                gen_images=kwargs["gen_images"],
+                gen_audio=kwargs["gen_audio"],
+                burn_subs=kwargs["burn_subs"],
+                api_key=api_key,
+                cache_dir=cache_dir,
+                **{k: v for k, v in kwargs.items() if k in PIPELINE_OPTIONS}
+            )
+            failed = [v for v in summary["variants"] if v["status"] != "ok" or v.get("render_error")]
+            record["status"] = "error" if failed else "ok"
+            record["variants"] = len(summary["variants"])
+            record["saved"] = summary["saved"]
+            if failed:
+                record["error"] = "; ".join(f"{variant_id(v)}: {v.get('error') or v['render_error']}" for v in failed)[:2000]
+            record["elapsed_sec"] = round(time.perf_counter() - t0, 3)
+            return record
+        result = run_pipeline(
+            user_prompt=prompt,
+            out_dir=out_dir,
+            api_key=api_key,
+            cache_dir=cache_dir,
+            **kwargs
+        )
+        record["status"] = "error" if result.get("render_error") else "ok"
+        record["final_video_path"] = result.get("final_video_path")
+        if result.get("render_error"):
+            record["error"] = f"Render failed: {result['render_error']}"[:2000]
+        policy = retention_policy()
+        if policy["prune_intermediates"] and record["status"] == "ok":
+            record["pruned"] = prune_intermediates(out_dir, segments=policy["prune_segments"])
+        update_index(out_root, out_dir)
+    except Exception as e:
+        record["status"] = "error"
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["elapsed_sec"] = round(time.perf_counter() - t0, 3)
+    return record
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Run lesson requests from a JSONL file headlessly")
+    ap.add_argument("input", help="JSONL file, one lesson request per line")
+    ap.add_argument("--out-root", default=os.path.join("outputs", "batch"))
+    ap.add_argument("--results", default=None, help="results JSONL (default: <out-root>/results.jsonl)")
+    ap.add_argument("--checkpoint", default=None, help="completed run ids (default: <out-root>/checkpoint.txt)")
+    ap.add_argument("--jobs", type=int, default=2, help="lessons in flight at once")
+    ap.add_argument("--api-concurrency", type=int, default=8, help="GenAI calls in flight across all lessons")
+    for endpoint in RATE_LIMITS:
+        ap.add_argument(f"--{endpoint}-rpm", type=float, default=None, help=f"{endpoint} requests per minute across all lessons (0 disables)")
+    ap.add_argument("--render-jobs", type=int, default=os.cpu_count() or 1, help="ffmpeg processes across all lessons")
+    ap.add_argument("--cache-dir", default=os.getenv("UNFOLD_CACHE_DIR", "cache"))
+    ap.add_argument("--metrics-file", default=None, help="Prometheus text file rewritten after every lesson (default: $UNFOLD_METRICS_FILE)")
+    ap.add_argument("--enforce-retention", action="store_true", help="after the batch, delete runs outside the UNFOLD_RETENTION_* policy (also UNFOLD_RETENTION_ENFORCE=1)")
+    ap.add_argument("--metrics-port", type=int, default=None, help="serve Prometheus metrics on this port while the batch runs")
+    args = ap.parse_args(argv)
+
+    load_dotenv()
+    api_key = os.getenv("GEMINI_API_KEY", "").strip()
+    if not api_key:
+        print("Missing GEMINI_API_KEY. Add it to your .env file.", file=sys.stderr)
+        return 2
+
+    os.makedirs(args.out_root, exist_ok=True)
+    ensure_index(args.out_root)
+    results_path = args.results or os.path.join(args.out_root, "results.jsonl")
+    checkpoint_path = args.checkpoint or os.path.join(args.out_root, "checkpoint.txt")
+    done = _load_checkpoint(checkpoint_path)
+
+    if args.metrics_port:
+        serve_metrics(args.metrics_port)
+    set_api_concurrency(args.api_concurrency)
+    set_max_concurrent_jobs(args.render_jobs)
+    for endpoint in RATE_LIMITS:
+        rpm = getattr(args, f"{endpoint}_rpm")
+        if rpm is not None:
+            set_rate_limit(endpoint, rpm)
+
+    lock = threading.Lock()
+    latencies = []
+    counts = {"ok": 0, "error": 0, "skipped": 0}
+
+    def emit(record: dict):
+        with lock:
+            with open(results_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+            if record["status"] == "ok":
+                with open(checkpoint_path, "a", encoding="utf-8") as f:
+                    f.write(record["run_id"] + "\n")
+                latencies.append(record["elapsed_sec"])
+            counts[record["status"]] = counts.get(record["status"], 0) + 1
+            write_metrics(args.metrics_file)
+        print(json.dumps({k: record.get(k) for k in ("run_id", "status", "elapsed_sec", "error")}), flush=True)
+
+    t0 = time.perf_counter()
+    jobs = max(1, args.jobs)
+    pending = set()
+    seen = set()
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        for line_no, req, err in _iter_requests(args.input):
+            if err:
+                emit({"run_id": None, "line": line_no, "status": "error", "error": err, "elapsed_sec": 0.0})
+                continue
+            run_id = _run_id(req)
+            if run_id in done or run_id in seen:
+                counts["skipped"] += 1
+                continue
+            seen.add(run_id)
+            if len(pending) >= jobs * 2:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    emit(fut.result())
+            pending.add(pool.submit(run_job, req, run_id, args.out_root, api_key, args.cache_dir))
+        for fut in wait(pending).done:
+            emit(fut.result())
+
+    wall = time.perf_counter() - t0
+    policy = retention_policy()
+    retention = enforce_retention(args.out_root, policy) if args.enforce_retention or policy["enforce"] else {"deleted": []}
+    summary = {
+        "completed": counts["ok"],
+        "failed": counts["error"],
+        "skipped": counts["skipped"],
+        "wall_sec": round(wall, 3),
+        "lessons_per_hour": round(counts["ok"] * 3600 / wall, 2) if wall > 0 else None,
+        "p50_sec": _percentile(latencies, 0.50),
+        "p95_sec": _percentile(latencies, 0.95),
+        "retention_deleted": len(retention["deleted"]),
+        "results": results_path
+    }
+    print(json.dumps(summary, indent=2))
+    return 0 if counts["error"] == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
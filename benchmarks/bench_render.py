@@ -0,0 +1,63 @@
+# Serial vs parallel scene rendering for a 7-scene lesson.
+# Run from the repo root: python -m benchmarks.bench_render [--scenes 7] [--duration 10] [--profile draft]
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from core.assembler import render_scenes
+from core.media_agent import _write_silence_wav
+from tools.env_utils import has_ffmpeg
+from tools.ffmpeg_render import RENDER_PROFILES, DEFAULT_PROFILE
+from tools.placeholders import solid_png
+
+def _make_assets(work_dir: str, n_scenes: int, duration_sec: int) -> list:
+    png = solid_png()
+    scenes = []
+    for i in range(n_scenes):
+        idx = i + 1
+        img = os.path.join(work_dir, f"scene_{idx:02d}.png")
+        aud = os.path.join(work_dir, f"scene_{idx:02d}.wav")
+        with open(img, "wb") as f:
+            f.write(png)
+        _write_silence_wav(aud, duration_sec=duration_sec)
+        scenes.append({"index": idx, "image_path": img, "audio_path": aud, "target_duration_sec": duration_sec})
+    return scenes
+
+def _time_render(scenes: list, out_dir: str, parallel: bool, max_jobs: int = None, profile: str = None) -> float:
+    os.makedirs(out_dir, exist_ok=True)
+    t0 = time.perf_counter()
+    render_scenes(scenes, out_dir, parallel=parallel, max_jobs=max_jobs, profile=profile)
+    return time.perf_counter() - t0
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark serial vs parallel scene rendering")
+    ap.add_argument("--scenes", type=int, default=7)
+    ap.add_argument("--duration", type=int, default=10)
+    ap.add_argument("--max-jobs", type=int, default=None)
+    ap.add_argument("--profile", choices=list(RENDER_PROFILES), default=DEFAULT_PROFILE)
+    args = ap.parse_args(argv)
+
+    if not has_ffmpeg():
+        print("ffmpeg not found on PATH", file=sys.stderr)
+        return 1
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        scenes = _make_assets(work_dir, args.scenes, args.duration)
+        serial = _time_render(scenes, os.path.join(work_dir, "serial"), parallel=False, profile=args.profile)
+        parallel = _time_render(scenes, os.path.join(work_dir, "parallel"), parallel=True, max_jobs=args.max_jobs, profile=args.profile)
+
+    print(json.dumps({
+        "scenes": args.scenes,
+        "profile": args.profile,
+        "scene_duration_sec": args.duration,
+        "cpus": os.cpu_count(),
+        "serial_sec": round(serial, 3),
+        "parallel_sec": round(parallel, 3),
+        "speedup": round(serial / parallel, 2) if parallel > 0 else None
+    }, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+# Safety matcher benchmark against synthetic lexicons. Run from the repo root:
+#   python -m benchmarks.bench_safety --terms 10000 50000
+import sys
+import json
+import time
+import random
+import string
+import argparse
+from benchmarks.fake_genai import FakeGenAIClient
+from benchmarks.timing import timeit
+from core.safety import BLOCKED_TERMS, SafetyMatcher
+
+def _lexicon(n: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    terms = set(BLOCKED_TERMS)
+    while len(terms) < n:
+        words = ["".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 10))) for _ in range(rng.choice((1, 1, 1, 2, 3)))]
+        terms.add(" ".join(words))
+    return sorted(terms)
+
+def _substring_loop(terms: list, text: str):
+    t = text.lower()
+    for b in terms:
+        if b in t:
+            return b
+    return None
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Safety matcher benchmark")
+    ap.add_argument("--terms", type=int, nargs="+", default=[10000, 50000])
+    ap.add_argument("--scenes", type=int, default=7)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--skip-loop", action="store_true", help="skip the legacy substring loop")
+    args = ap.parse_args(argv)
+
+    script_text = FakeGenAIClient(scenes=args.scenes).generate_text(system="script", user="{}")
+    scenes = json.loads(script_text)["scenes"]
+    fields = []
+    for s in scenes:
+        fields.append((f"scene {s['index']} image prompt", s["visual_prompt"]))
+        fields.append((f"scene {s['index']} narration", s["narration"]))
+
+    report = {"scenes": args.scenes, "script_chars": len(script_text), "results": {}}
+    for n in args.terms:
+        terms = _lexicon(n)
+        t0 = time.perf_counter()
+        matcher = SafetyMatcher(terms)
+        row = {"compile_ms": round((time.perf_counter() - t0) * 1000.0, 3)}
+        row["compiled.script"] = timeit(lambda: matcher._first_match(script_text), args.repeat)
+        row["compiled.fields_each"] = timeit(lambda: [matcher._first_match(t) for _, t in fields], args.repeat)
+        row["compiled.fields_batch"] = timeit(lambda: matcher.find_all(fields), args.repeat)
+        row["compiled.script_memo"] = timeit(lambda: matcher.first_match(script_text), args.repeat)
+        if not args.skip_loop:
+            plain = [t.rstrip("*") for t in terms]
+            row["loop.script"] = timeit(lambda: _substring_loop(plain, script_text), args.repeat)
+            row["loop.fields_each"] = timeit(lambda: [_substring_loop(plain, t) for _, t in fields], args.repeat)
+        report["results"][str(n)] = row
+
+    print(json.dumps(report, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+# Offline stage micro-benchmarks. Run from the repo root:
+#   python -m benchmarks.bench_stages --out bench.json
+#   python -m benchmarks.bench_stages --baseline bench.json
+import os
+import sys
+import json
+import argparse
+import platform
+import tempfile
+from benchmarks.fake_genai import FakeGenAIClient
+from benchmarks.timing import timeit
+from core.media_agent import _write_silence_wav, generate_scene_media
+from core.safety import default_matcher
+from tools.env_utils import has_ffmpeg
+from tools.ffmpeg_render import render_scene_video, concat_videos, burn_subtitles
+from tools.json_utils import extract_json
+from tools.placeholders import solid_png
+from tools.subtitles import build_srt
+
+def _big_script_text(n_scenes: int) -> str:
+    return FakeGenAIClient(scenes=n_scenes).generate_text(system="script", user="{}")
+
+def _cases(work_dir: str, with_ffmpeg: bool, fake_latency: float) -> dict:
+    script_text = _big_script_text(7)
+    big_text = _big_script_text(2000)
+    fenced = "```json\n" + big_text + "\n```"
+    malformed = "Sure! Here is your lesson:\n" + big_text + "\nHope this helps {not json"
+    script = json.loads(script_text)
+    long_text = " ".join(s["narration"] for s in json.loads(big_text)["scenes"])
+    # time the work behind the memoized entry points, not the cache lookup
+    matcher = default_matcher()
+
+    cases = {
+        "extract_json.small": lambda: extract_json(script_text),
+        "extract_json.large": lambda: extract_json(big_text),
+        "extract_json.fenced_large": lambda: extract_json(fenced),
+        "extract_json.malformed_large": lambda: extract_json(malformed),
+        "safety.enforce_kid_safety.short": lambda: matcher._first_match("Teach triangles to an 8 year old in a super heroes way"),
+        "safety.enforce_kid_safety.long": lambda: matcher._first_match(long_text),
+        "placeholders.solid_png": lambda: solid_png.__wrapped__(),
+        "subtitles.build_srt": lambda: build_srt(script, os.path.join(work_dir, "captions.srt")),
+        "media.write_silence_wav_30s": lambda: _write_silence_wav(os.path.join(work_dir, "silence.wav"), 30.0),
+        "media.generate_scene_media_fake": lambda: generate_scene_media(
+            FakeGenAIClient(latency_sec=fake_latency), script, os.path.join(work_dir, "media")
+        )
+    }
+    os.makedirs(os.path.join(work_dir, "media"), exist_ok=True)
+
+    if with_ffmpeg:
+        img = os.path.join(work_dir, "bench.png")
+        aud = os.path.join(work_dir, "bench.wav")
+        with open(img, "wb") as f:
+            f.write(solid_png())
+        _write_silence_wav(aud, 3.0)
+        seg = os.path.join(work_dir, "seg.mp4")
+        joined = os.path.join(work_dir, "joined.mp4")
+        srt = os.path.join(work_dir, "bench.srt")
+        build_srt({"scenes": [{"narration": "Three sides!", "target_duration_sec": 3}] * 3}, srt)
+        render_scene_video(img, aud, 3, seg)
+        concat_videos([seg] * 3, joined)
+        cases["ffmpeg.render_scene_video_3s"] = lambda: render_scene_video(img, aud, 3, seg)
+        cases["ffmpeg.concat_videos_3x3s"] = lambda: concat_videos([seg] * 3, joined)
+        cases["ffmpeg.burn_subtitles_9s"] = lambda: burn_subtitles(joined, srt, os.path.join(work_dir, "burned.mp4"))
+    return cases
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    regressions = []
+    for name, cur in results.items():
+        base = baseline.get(name)
+        if not base or not base.get("median_ms"):
+            continue
+        ratio = cur["median_ms"] / base["median_ms"]
+        cur["baseline_median_ms"] = base["median_ms"]
+        cur["ratio"] = round(ratio, 3)
+        if ratio > threshold:
+            regressions.append(name)
+    return regressions
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Offline stage micro-benchmarks")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--ffmpeg-repeat", type=int, default=2)
+    ap.add_argument("--fake-latency", type=float, default=0.05, help="seconds per fake GenAI call")
+    ap.add_argument("--skip-ffmpeg", action="store_true")
+    ap.add_argument("--only", default=None, help="substring filter on case names")
+    ap.add_argument("--out", default=None, help="write results JSON here")
+    ap.add_argument("--baseline", default=None, help="compare against a previous results JSON")
+    ap.add_argument("--threshold", type=float, default=1.25, help="median ratio that counts as a regression")
+    args = ap.parse_args(argv)
+
+    with_ffmpeg = has_ffmpeg() and not args.skip_ffmpeg
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        for name, fn in _cases(work_dir, with_ffmpeg, args.fake_latency).items():
+            if args.only and args.only not in name:
+                continue
+            repeat = args.ffmpeg_repeat if name.startswith("ffmpeg.") else args.repeat
+            results[name] = timeit(fn, repeat)
+
+    report = {
+        "env": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "ffmpeg": with_ffmpeg
+        },
+        "results": results
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f).get("results", {})
+        regressions = compare(results, baseline, args.threshold)
+        report["regressions"] = regressions
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,43 @@
+# Checks that resubmitting a finished run reuses its plan, script and media. Run from the repo root:
+#   python -m benchmarks.check_reuse
+import sys
+import json
+import time
+import argparse
+import tempfile
+from benchmarks.fake_genai import FakeGenAIClient
+from core.jobs import JobRunner, read_status, resubmit_kwargs
+
+def _wait(runner: JobRunner, run_id: str):
+    while runner.is_active(run_id):
+        time.sleep(0.1)
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Verify that re-rendering a fresh=True run makes no GenAI calls")
+    ap.add_argument("--profile", default="final", help="render profile for the re-render")
+    ap.add_argument("--scenes", type=int, default=5)
+    args = ap.parse_args(argv)
+
+    out_dir = tempfile.mkdtemp(prefix="unfold_reuse_")
+    runner = JobRunner(1)
+    request = {
+        "user_prompt": "Teach triangles", "age": 8, "difficulty": 3, "duration_sec": 30, "theme": "Space",
+        "gen_images": True, "gen_audio": True, "burn_subs": True, "fresh": True, "render_profile": "draft"
+    }
+    runner.submit("reuse", out_dir, **request, api_key="fake", genai_client=FakeGenAIClient(scenes=args.scenes, audio_sec=2))
+    _wait(runner, "reuse")
+    status = read_status(out_dir)
+    if status["state"] != "done":
+        print(f"first run failed: {status.get('error')}", file=sys.stderr)
+        return 1
+
+    client = FakeGenAIClient(scenes=args.scenes, audio_sec=2)
+    runner.submit("reuse", out_dir, **resubmit_kwargs(status["request"], render_profile=args.profile), api_key="fake", genai_client=client)
+    _wait(runner, "reuse")
+    status = read_status(out_dir)
+    ok = status["state"] == "done" and not any(client.calls.values())
+    print(json.dumps({"state": status["state"], "error": status.get("error"), "rerender_calls": client.calls, "ok": ok}))
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
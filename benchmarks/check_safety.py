@@ -0,0 +1,27 @@
+# Checks the safety matcher against words it must block and words it must let through. Run from the repo root:
+#   python -m benchmarks.check_safety
+import sys
+import json
+from core.safety import default_matcher
+
+BLOCKED = (
+    "sex", "sexy", "sexual", "sexually", "sexuality", "sexting", "nudes", "pornography", "molested",
+    "groom", "grooming", "groomed", "hookups", "raped", "the SEX.", "past tease 8 year old"
+)
+ALLOWED = (
+    "Sussex", "Essex county", "grapes", "therapy", "assignment", "sextant", "sexton",
+    "rapeseed oil", "unmolested", "Teach triangles to an 8 year old in a super heroes way"
+)
+
+def main(argv=None) -> int:
+    matcher = default_matcher()
+    missed = [t for t in BLOCKED if not matcher._first_match(t)]
+    flagged = {t: matcher._first_match(t) for t in ALLOWED if matcher._first_match(t)}
+    hits = matcher.find_all({"a": "fine grapes", "b": "sexually explicit", "c": "Sussex grooming"})
+    if [h["field"] for h in hits] != ["b", "c"]:
+        missed.append(f"find_all: {hits}")
+    print(json.dumps({"missed": missed, "false_positives": flagged, "ok": not missed and not flagged}))
+    return 0 if not missed and not flagged else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
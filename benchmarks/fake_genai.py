@@ -0,0 +1,61 @@
+import io
+import json
+import time
+import wave
+import threading
+from tools.placeholders import solid_png
+
+class FakeGenAIClient:
+    def __init__(self, latency_sec: float = 0.0, image_size: tuple = (1280, 720), audio_sec: float = 8.0, scenes: int = 7):
+        self.latency_sec = latency_sec
+        self.image_size = image_size
+        self.audio_sec = audio_sec
+        self.scenes = scenes
+        self.calls = {"text": 0, "image": 0, "audio": 0}
+        self._lock = threading.Lock()
+        self._png = None
+        self._wav = None
+
+    def _tick(self, kind: str):
+        with self._lock:
+            self.calls[kind] += 1
+        if self.latency_sec > 0:
+            time.sleep(self.latency_sec)
+
+    def generate_text(self, system: str, user: str, model: str = None, response_schema=None):
+        self._tick("text")
+        if "planning" in system:
+            return json.dumps({
+                "topic": "Triangles",
+                "learning_goals": ["Know the three sides", "Spot triangles around you", "Name a right triangle"],
+                "safety_rules": ["Kid-safe language"],
+                "scenes": [{"index": i + 1, "title": f"Scene {i + 1}", "target_duration_sec": 10} for i in range(self.scenes)]
+            })
+        return json.dumps({"scenes": [{
+            "index": i + 1,
+            "title": f"Scene {i + 1}",
+            "narration": f"Scene {i + 1}: a triangle has three sides and three corners.",
+            "on_screen_text": "Three sides!",
+            "visual_prompt": f"A smiling hero points at triangle number {i + 1}",
+            "quiz_prompt": "How many sides?" if i == self.scenes - 1 else None,
+            "target_duration_sec": 10
+        } for i in range(self.scenes)]})
+
+    def generate_image(self, prompt: str, model: str = None):
+        self._tick("image")
+        if self._png is None:
+            w, h = self.image_size
+            self._png = solid_png(w, h, (120, 180, 240))
+        return self._png
+
+    def generate_audio(self, text: str):
+        self._tick("audio")
+        if self._wav is None:
+            buf = io.BytesIO()
+            with wave.open(buf, "w") as wf:
+                wf.setnchannels(1)
+                wf.setsampwidth(2)
+                wf.setframerate(22050)
+                wf.writeframes(b"\x00\x00" * int(22050 * self.audio_sec))
+            self._wav = buf.getvalue()
+        return self._wav
@@ -0,0 +1,164 @@
+# End-to-end load test against the stub GenAI server. Run from the repo root:
+#   python -m benchmarks.load_test --lessons 8 --concurrency 1,2,4 --profile draft
+#   python -m benchmarks.load_test --base-url http://127.0.0.1:8765 --lessons 20 --concurrency 4
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import subprocess
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from batch import _percentile
+from core.director import run_pipeline
+from benchmarks.stub_genai_server import add_stub_args
+from tools.genai_client import get_client, set_api_concurrency, set_rate_limit, RATE_LIMITS
+from tools.ffmpeg_render import set_max_concurrent_jobs, RENDER_PROFILES
+from tools.env_utils import has_ffmpeg
+
+def start_stub(args) -> tuple:
+    cmd = [sys.executable, "-m", "benchmarks.stub_genai_server", "--port", "0"]
+    for name in ("text_latency", "image_latency", "audio_latency", "error_rate", "rate_limit_rate", "image_size", "audio_sec", "scenes"):
+        cmd += [f"--{name.replace('_', '-')}", str(getattr(args, name))]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    line = proc.stdout.readline().strip()
+    if not line.startswith("stub GenAI server on "):
+        proc.kill()
+        raise RuntimeError(f"Stub server failed to start: {line}")
+    return proc, line.rsplit(" ", 1)[-1]
+
+def stub_stats(base_url: str) -> dict:
+    try:
+        with urllib.request.urlopen(f"{base_url}/stats", timeout=5) as r:
+            return json.load(r)
+    except Exception:
+        return None
+
+def _usage() -> tuple:
+    me = resource.getrusage(resource.RUSAGE_SELF)
+    kids = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return me.ru_utime + me.ru_stime, kids.ru_utime + kids.ru_stime, me.ru_maxrss, kids.ru_maxrss
+
+def run_lesson(i: int, args, client, out_root: str) -> dict:
+    t0 = time.perf_counter()
+    record = {"lesson": i}
+    try:
+        result = run_pipeline(
+            user_prompt=f"{args.prompt} (load test lesson {i})", age=8, difficulty=3, duration_sec=args.duration,
+            theme="Space", out_dir=os.path.join(out_root, f"lesson_{i:04d}"), gen_images=True, gen_audio=True,
+            burn_subs=args.burn_subs, api_key="stub", render_profile=args.profile, genai_client=client
+        )
+        events = result["trace"]["events"]
+        record.update(
+            status="error" if result.get("render_error") else "ok",
+            error=result.get("render_error"),
+            scenes=len(result["script"]["scenes"]),
+            image_fallbacks=events.get("fallback.image", 0),
+            audio_fallbacks=events.get("fallback.audio", 0),
+            retries=events.get("genai.retry", 0)
+        )
+    except Exception as e:
+        record.update(status="error", error=f"{type(e).__name__}: {e}"[:500])
+    record["elapsed_sec"] = round(time.perf_counter() - t0, 3)
+    return record
+
+def run_level(args, client, concurrency: int, work_dir: str) -> dict:
+    out_root = os.path.join(work_dir, f"c{concurrency}")
+    cpu0, kid_cpu0, _, _ = _usage()
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        records = list(pool.map(lambda i: run_lesson(i, args, client, out_root), range(args.lessons)))
+    wall = time.perf_counter() - t0
+    cpu1, kid_cpu1, rss, kid_rss = _usage()
+    if not args.keep:
+        shutil.rmtree(out_root, ignore_errors=True)
+    ok = [r for r in records if r["status"] == "ok"]
+    scenes = sum(r.get("scenes", 0) for r in records) or 1
+    cpu = (cpu1 - cpu0) + (kid_cpu1 - kid_cpu0)
+    return {
+        "concurrency": concurrency,
+        "lessons": len(records),
+        "ok": len(ok),
+        "failed": len(records) - len(ok),
+        "wall_sec": round(wall, 3),
+        "lessons_per_hour": round(len(ok) * 3600 / wall, 2) if wall > 0 else None,
+        "p50_sec": _percentile([r["elapsed_sec"] for r in ok], 0.50),
+        "p95_sec": _percentile([r["elapsed_sec"] for r in ok], 0.95),
+        "p99_sec": _percentile([r["elapsed_sec"] for r in ok], 0.99),
+        "cpu_sec": round(cpu, 3),
+        "cpu_util": round(cpu / wall / (os.cpu_count() or 1), 3) if wall > 0 else None,
+        "peak_rss_mb": round(rss / 1024, 1),
+        "peak_child_rss_mb": round(kid_rss / 1024, 1),
+        "image_fallback_rate": round(sum(r.get("image_fallbacks", 0) for r in records) / scenes, 3),
+        "audio_fallback_rate": round(sum(r.get("audio_fallbacks", 0) for r in records) / scenes, 3),
+        "retries": sum(r.get("retries", 0) for r in records),
+        "errors": sorted({r["error"] for r in records if r.get("error")})[:5]
+    }
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Drive concurrent lessons through the real pipeline against a stub GenAI server")
+    ap.add_argument("--lessons", type=int, default=8, help="lessons per concurrency level")
+    ap.add_argument("--concurrency", default="1,2,4", help="comma-separated lessons-in-flight levels to sweep")
+    ap.add_argument("--base-url", default=None, help="use an already running stub server instead of starting one")
+    ap.add_argument("--prompt", default="Teach triangles to an 8 year old in a super heroes way")
+    ap.add_argument("--duration", type=int, default=60)
+    ap.add_argument("--profile", default="draft", choices=list(RENDER_PROFILES))
+    ap.add_argument("--burn-subs", action="store_true")
+    ap.add_argument("--api-concurrency", type=int, default=8)
+    ap.add_argument("--render-jobs", type=int, default=os.cpu_count() or 1)
+    for endpoint in RATE_LIMITS:
+        ap.add_argument(f"--{endpoint}-rpm", type=float, default=None, help=f"{endpoint} requests per minute (0 disables the limiter)")
+    ap.add_argument("--work-dir", default=None)
+    ap.add_argument("--keep", action="store_true", help="keep lesson outputs")
+    ap.add_argument("--out", default=None, help="write the report as JSON")
+    add_stub_args(ap)
+    args = ap.parse_args(argv)
+    if not has_ffmpeg():
+        print("FFmpeg not found; lessons will skip rendering.", file=sys.stderr)
+
+    set_api_concurrency(args.api_concurrency)
+    set_max_concurrent_jobs(args.render_jobs)
+    for endpoint in RATE_LIMITS:
+        rpm = getattr(args, f"{endpoint}_rpm")
+        if rpm is not None:
+            set_rate_limit(endpoint, rpm)
+
+    proc, base_url = (None, args.base_url) if args.base_url else start_stub(args)
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="unfold_load_")
+    try:
+        # generate_images only works against Vertex AI, so talk to the stub in Vertex express mode
+        client = get_client("stub", base_url=base_url, vertexai=True)
+        levels = [run_level(args, client, int(c), work_dir) for c in args.concurrency.split(",") if c.strip()]
+        report = {
+            "host": {"cpus": os.cpu_count()},
+            "base_url": base_url,
+            "profile": args.profile,
+            "levels": levels,
+            "stub_calls": stub_stats(base_url)
+        }
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+        if not args.keep and not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    best = max(levels, key=lambda lv: lv["lessons_per_hour"] or 0)
+    report["saturation_concurrency"] = best["concurrency"]
+    for lv in levels:
+        print(f"c={lv['concurrency']:>3}  {lv['lessons_per_hour']:>8} lessons/h  p50 {lv['p50_sec']}s  p95 {lv['p95_sec']}s  cpu {lv['cpu_util']}  rss {lv['peak_rss_mb']}MB  img fb {lv['image_fallback_rate']}  aud fb {lv['audio_fallback_rate']}  retries {lv['retries']}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if not (report["stub_calls"] or {}).get("image") and any(lv["image_fallback_rate"] >= 1.0 for lv in levels):
+        print("error: every image call fell back to a placeholder and none reached the stub's :predict endpoint", file=sys.stderr)
+        return 2
+    return 0 if all(lv["failed"] == 0 for lv in levels) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
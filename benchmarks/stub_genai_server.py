@@ -0,0 +1,157 @@
+# Local stand-in for the Gemini/Imagen REST endpoints used by GenAIClient.
+#   python -m benchmarks.stub_genai_server --port 8765 --image-latency lognormal:2,0.4 --rate-limit-rate 0.05
+# then point the app at it with UNFOLD_GENAI_BASE_URL=http://127.0.0.1:8765 (plus GOOGLE_GENAI_USE_VERTEXAI=true
+# so Imagen calls are sent instead of being rejected by the SDK)
+import json
+import time
+import base64
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from benchmarks.fake_genai import FakeGenAIClient
+from tools.genai_client import AUDIO_INSTRUCTION
+
+def parse_latency(spec: str):
+    kind, _, args = (spec or "fixed:0").partition(":")
+    vals = [float(x) for x in args.split(",") if x.strip()] or [0.0]
+    if kind == "fixed":
+        return lambda: vals[0]
+    if kind == "uniform":
+        return lambda: random.uniform(vals[0], vals[1] if len(vals) > 1 else vals[0])
+    if kind == "lognormal":
+        median, sigma = vals[0], vals[1] if len(vals) > 1 else 0.5
+        return lambda: random.lognormvariate(0.0, sigma) * median
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+class StubState:
+    def __init__(self, latency: dict, error_rate: float = 0.0, rate_limit_rate: float = 0.0, image_size: tuple = (1280, 720), audio_sec: float = 8.0, scenes: int = 7):
+        self.latency = {k: parse_latency(v) for k, v in latency.items()}
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.fake = FakeGenAIClient(image_size=image_size, audio_sec=audio_sec, scenes=scenes)
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def count(self, key: str):
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.counts)
+
+def _prompt_text(body: dict) -> str:
+    return "".join(p.get("text", "") for c in body.get("contents", []) for p in c.get("parts", []))
+
+def _text_response(text: str) -> dict:
+    return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP", "index": 0}]}
+
+class StubHandler(BaseHTTPRequestHandler):
+    state = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send(self, code: int, payload: dict):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _fail(self, endpoint: str) -> bool:
+        roll = random.random()
+        if roll < self.state.rate_limit_rate:
+            self.state.count(f"{endpoint}.429")
+            self._send(429, {"error": {"code": 429, "message": "Resource exhausted (stub)", "status": "RESOURCE_EXHAUSTED"}})
+            return True
+        if roll < self.state.rate_limit_rate + self.state.error_rate:
+            self.state.count(f"{endpoint}.500")
+            self._send(500, {"error": {"code": 500, "message": "Internal error (stub)", "status": "INTERNAL"}})
+            return True
+        return False
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            self._send(200, self.state.stats())
+        else:
+            self._send(404, {"error": {"code": 404, "message": "Not found", "status": "NOT_FOUND"}})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        method = self.path.split("?", 1)[0].rsplit(":", 1)[-1]
+        if method == "predict":
+            endpoint = "image"
+        elif method in ("generateContent", "streamGenerateContent"):
+            endpoint = "audio" if _prompt_text(body).startswith(AUDIO_INSTRUCTION) else "text"
+        else:
+            self._send(404, {"error": {"code": 404, "message": f"Unknown method {method}", "status": "NOT_FOUND"}})
+            return
+        time.sleep(max(0.0, self.state.latency[endpoint]()))
+        if self._fail(endpoint):
+            return
+        self.state.count(endpoint)
+        if endpoint == "image":
+            png = self.state.fake.generate_image(prompt=body.get("instances", [{}])[0].get("prompt", ""))
+            self._send(200, {"predictions": [{"bytesBase64Encoded": base64.b64encode(png).decode("ascii"), "mimeType": "image/png"}]})
+        elif endpoint == "audio":
+            wav = self.state.fake.generate_audio(text=_prompt_text(body))
+            data = base64.b64encode(wav).decode("ascii")
+            self._send(200, {"candidates": [{"content": {"role": "model", "parts": [{"inlineData": {"mimeType": "audio/wav", "data": data}}]}, "finishReason": "STOP", "index": 0}]})
+        elif method == "streamGenerateContent":
+            self._stream(self.state.fake.generate_text(system=_prompt_text(body), user=""))
+        else:
+            self._send(200, _text_response(self.state.fake.generate_text(system=_prompt_text(body), user="")))
+
+    def _stream(self, text: str, chunk: int = 200):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for i in range(0, len(text), chunk):
+            self.wfile.write(f"data: {json.dumps(_text_response(text[i:i + chunk]))}\r\n\r\n".encode("utf-8"))
+            self.wfile.flush()
+        self.close_connection = True
+
+def make_server(state: StubState, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    handler = type("BoundStubHandler", (StubHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def add_stub_args(ap: argparse.ArgumentParser):
+    for endpoint, default in (("text", "lognormal:1.0,0.4"), ("image", "lognormal:3.0,0.4"), ("audio", "lognormal:2.0,0.4")):
+        ap.add_argument(f"--{endpoint}-latency", default=default, help="fixed:S | uniform:LO,HI | lognormal:MEDIAN,SIGMA (seconds)")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with HTTP 500")
+    ap.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of calls answered with HTTP 429")
+    ap.add_argument("--image-size", default="1280x720", help="WxH of returned PNGs")
+    ap.add_argument("--audio-sec", type=float, default=8.0, help="length of returned WAVs")
+    ap.add_argument("--scenes", type=int, default=7, help="scenes per returned plan/script")
+
+def stub_state(args) -> StubState:
+    w, h = (int(x) for x in args.image_size.lower().split("x"))
+    return StubState(
+        {"text": args.text_latency, "image": args.image_latency, "audio": args.audio_latency},
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+        image_size=(w, h), audio_sec=args.audio_sec, scenes=args.scenes
+    )
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Serve stub Gemini/Imagen endpoints for load testing")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    add_stub_args(ap)
+    args = ap.parse_args(argv)
+    server = make_server(stub_state(args), args.host, args.port)
+    print(f"stub GenAI server on http://{args.host}:{server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
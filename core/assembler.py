@@ -1,36 +1,121 @@
 import os
 import json
-from tools.subtitles import build_srt
-from tools.ffmpeg_render import render_scene_video, concat_videos, burn_subtitles
+from concurrent.futures import ThreadPoolExecutor
+from tools.subtitles import build_srt, build_vtt
+from tools.ffmpeg_render import render_scene_video, render_slots, concat_videos, burn_subtitles, mux_soft_subtitles, render_lesson, render_profile, audio_fit
+from core.stage_graph import hash_inputs
+from tools.asset_cache import file_digest
+from tools.tracing import span, submit
+from tools.progress import report
 
-def assemble(out_dir: str, script: dict, assets_path: str, burn_subs: bool) -> dict:
+def _stage(graph, path: str, inputs: str, build) -> bool:
+    if graph is not None and graph.is_fresh(path, inputs):
+        return False
+    build()
+    if graph is not None:
+        graph.record(path, inputs)
+    return True
+
+def segment_inputs(s: dict, profile: str = None) -> str:
+    return hash_inputs(
+        "segment",
+        file_digest(s["image_path"]),
+        file_digest(s["audio_path"]),
+        int(s.get("target_duration_sec", 10)),
+        audio_fit(int(s.get("target_duration_sec", 10))),
+        render_profile(profile)
+    )
+
+def render_scene(s: dict, out_dir: str, threads: int = 0, graph=None, profile: str = None, hls=None, position: int = 0) -> str:
+    idx = int(s["index"])
+    img = s["image_path"]
+    aud = s["audio_path"]
+    dur = int(s.get("target_duration_sec", 10))
+    out_mp4 = os.path.join(out_dir, f"scene_{idx:02d}.mp4")
+    inputs = segment_inputs(s, profile) if graph is not None else None
+    stage = f"scene_{idx:02d}.render"
+    report(stage, "running")
+    built = _stage(graph, out_mp4, inputs, lambda: render_scene_video(image_path=img, audio_path=aud, duration_sec=dur, out_path=out_mp4, threads=threads, profile=profile))
+    report(stage, "done" if built else "reused")
+    if hls is not None:
+        hls.add(position, out_mp4)
+    return out_mp4
+
+def render_scenes(asset_scenes: list, out_dir: str, parallel: bool = True, max_jobs: int = None, graph=None, profile: str = None, hls=None) -> list:
+    if not parallel or len(asset_scenes) <= 1:
+        return [render_scene(s, out_dir, graph=graph, profile=profile, hls=hls, position=i) for i, s in enumerate(asset_scenes)]
+    workers, threads = render_slots(len(asset_scenes), max_jobs)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futs = [submit(pool, render_scene, s, out_dir, threads, graph, profile, hls, i) for i, s in enumerate(asset_scenes)]
+        return [f.result() for f in futs]
+
+def build_captions(out_dir: str, script: dict, burn_subs: bool, soft_subs: bool) -> tuple:
+    srt_path = os.path.join(out_dir, "captions.srt")
+    with span("subtitles.build_srt"):
+        build_srt(script, srt_path)
+    vtt_path = None
+    if soft_subs and not burn_subs:
+        vtt_path = os.path.join(out_dir, "captions.vtt")
+        with span("subtitles.build_vtt"):
+            build_vtt(script, vtt_path)
+    return srt_path, vtt_path
+
+def assemble(out_dir: str, script: dict, assets_path: str, burn_subs: bool, parallel: bool = True, max_jobs: int = None, single_pass: bool = False, soft_subs: bool = False, graph=None, profile: str = None, hls=None) -> dict:
     with open(assets_path, "r", encoding="utf-8") as f:
         assets = json.load(f)
 
-    srt_path = os.path.join(out_dir, "captions.srt")
-    build_srt(script, srt_path)
-
-    scene_videos = []
-    for s in assets["scenes"]:
-        idx = int(s["index"])
-        img = s["image_path"]
-        aud = s["audio_path"]
-        dur = int(s.get("target_duration_sec", 10))
-        out_mp4 = os.path.join(out_dir, f"scene_{idx:02d}.mp4")
-        render_scene_video(image_path=img, audio_path=aud, duration_sec=dur, out_path=out_mp4)
-        scene_videos.append(out_mp4)
+    srt_path, vtt_path = build_captions(out_dir, script, burn_subs, soft_subs)
+    soft_subs = vtt_path is not None
+
+    final_path = os.path.join(out_dir, "final.mp4")
+    if single_pass:
+        inputs = None
+        if graph is not None:
+            inputs = hash_inputs(
+                "final", "single_pass", burn_subs, soft_subs,
+                [segment_inputs(s, profile) for s in assets["scenes"]], file_digest(srt_path)
+            )
+        _stage(graph, final_path, inputs, lambda: render_lesson(
+            assets["scenes"], final_path,
+            burn_srt=srt_path if burn_subs else None,
+            soft_srt=srt_path if soft_subs else None,
+            profile=profile
+        ))
+        return {
+            "captions_srt": srt_path,
+            "captions_vtt": vtt_path,
+            "joined_video": None,
+            "final_video": final_path
+        }
+
+    try:
+        scene_videos = render_scenes(assets["scenes"], out_dir, parallel=parallel, max_jobs=max_jobs, graph=graph, profile=profile, hls=hls)
+    finally:
+        if hls is not None:
+            hls.finish()
+    return finish_video(out_dir, scene_videos, srt_path, vtt_path, burn_subs, graph=graph, profile=profile)
 
+def finish_video(out_dir: str, scene_videos: list, srt_path: str, vtt_path: str, burn_subs: bool, graph=None, profile: str = None) -> dict:
     joined = os.path.join(out_dir, "joined.mp4")
-    concat_videos(scene_videos, joined)
+    joined_inputs = None
+    if graph is not None:
+        joined_inputs = hash_inputs("joined", [graph.inputs_of(v) or file_digest(v) for v in scene_videos])
+    _stage(graph, joined, joined_inputs, lambda: concat_videos(scene_videos, joined))
 
     final_path = os.path.join(out_dir, "final.mp4")
+    final_inputs = None
+    if graph is not None:
+        final_inputs = hash_inputs("final", "burn" if burn_subs else "soft", joined_inputs, file_digest(srt_path), render_profile(profile))
     if burn_subs:
-        burn_subtitles(video_in=joined, srt_path=srt_path, video_out=final_path)
+        _stage(graph, final_path, final_inputs, lambda: burn_subtitles(video_in=joined, srt_path=srt_path, video_out=final_path, profile=profile))
+    elif vtt_path:
+        _stage(graph, final_path, final_inputs, lambda: mux_soft_subtitles(video_in=joined, srt_path=srt_path, video_out=final_path))
     else:
         final_path = joined
 
     return {
         "captions_srt": srt_path,
+        "captions_vtt": vtt_path,
         "joined_video": joined,
         "final_video": final_path
     }
@@ -1,12 +1,25 @@
 import os
 import json
-from core.schemas import LessonPlan, Scene
+import time
+import functools
+from pydantic import ValidationError
+from core.schemas import LessonPlan, Scene, PlanDraft, validation_summary
 from core.safety import enforce_kid_safety, sanitize_theme
-from core.script_agent import generate_script
-from core.media_agent import generate_scene_images, generate_scene_audio, write_asset_manifest
-from core.assembler import assemble
-from tools.genai_client import GenAIClient
+from core.script_agent import generate_script, generate_script_stream, rewrite_scene, check_scene, SCRIPT_SYSTEM
+from core.stage_graph import StageGraph, hash_inputs
+from core.media_agent import generate_scene_media, generate_scene_image, generate_scene_narration, checked_image_prompts, write_asset_manifest, MEDIA_CONCURRENCY
+from core.assembler import assemble, build_captions, finish_video, render_scenes
+from core.scene_pipeline import ScenePipeline, run_scene_pipeline
+from tools.genai_client import get_client, TEXT_MODEL
+from tools.asset_cache import AssetCache, file_digest
+from tools.response_cache import ResponseCache, generate_validated
 from tools.json_utils import extract_json
+from tools.env_utils import has_ffmpeg
+from tools.ffmpeg_render import DEFAULT_PROFILE, RENDER_PROFILES
+from tools.hls import HlsPlaylist
+from tools.tracing import new_trace, current_tracer, span, event
+from tools.progress import report
+from tools.metrics import counter, histogram, write_metrics
 
 DIRECTOR_SYSTEM = (
     "Return ONLY valid JSON. No markdown. No backticks. No prose. "
@@ -14,7 +27,29 @@ DIRECTOR_SYSTEM = (
     "No romance or sexual content, no bullying, no gore."
 )
 
-def _build_plan(genai_client, user_prompt: str, age: int, difficulty: int, duration_sec: int, theme: str) -> LessonPlan:
+LESSONS = counter("unfold_lessons_total", "Lessons finished by outcome", ("status",))
+LESSON_SECONDS = histogram("unfold_lesson_seconds", "End-to-end lesson wall time", buckets=(5, 10, 30, 60, 120, 300, 600, 1200))
+
+def _lesson_metrics(fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        t0 = time.perf_counter()
+        status = "error"
+        try:
+            result = fn(*args, **kwargs)
+            status = "render_error" if result.get("render_error") else "ok"
+            return result
+        finally:
+            LESSONS.inc(status=status)
+            LESSON_SECONDS.observe(time.perf_counter() - t0)
+            write_metrics()
+    return wrapper
+
+def _validate_plan(text: str) -> dict:
+    enforce_kid_safety(text)
+    return PlanDraft.model_validate(extract_json(text)).model_dump()
+
+def _build_plan(genai_client, user_prompt: str, age: int, difficulty: int, duration_sec: int, theme: str, cache=None, fresh: bool = False, neutral: bool = False) -> LessonPlan:
     theme = sanitize_theme(theme)
     enforce_kid_safety(user_prompt)
     req = {
@@ -34,9 +69,16 @@ def _build_plan(genai_client, user_prompt: str, age: int, difficulty: int, durat
             "Total target_duration_sec should be close to duration_sec."
         ]
     }
-    text = genai_client.generate_text(system=DIRECTOR_SYSTEM, user=json.dumps(req))
-    enforce_kid_safety(text)
-    data = extract_json(text)
+    if neutral:
+        del req["theme"]
+        req["rules"].append("The plan is shared by lessons with different themes: keep topic and scene titles theme-neutral.")
+    try:
+        data = generate_validated(genai_client, DIRECTOR_SYSTEM, json.dumps(req), _validate_plan, cache=cache, fresh=fresh, response_schema=PlanDraft)
+    except ValidationError as e:
+        errors = validation_summary(e)
+        event("plan.repair", error=errors)
+        req["previous_attempt_errors"] = errors
+        data = generate_validated(genai_client, DIRECTOR_SYSTEM, json.dumps(req), _validate_plan, cache=cache, fresh=fresh, response_schema=PlanDraft)
 
     topic = str(data.get("topic", "Lesson")).strip()[:80] or "Lesson"
     learning_goals = data.get("learning_goals", [])
@@ -49,9 +91,7 @@ def _build_plan(genai_client, user_prompt: str, age: int, difficulty: int, durat
         safety_rules = []
     safety_rules = [str(x).strip()[:120] for x in safety_rules if str(x).strip()][:8]
 
-    raw_scenes = data.get("scenes", [])
-    if not isinstance(raw_scenes, list) or len(raw_scenes) < 5:
-        raw_scenes = [{"index": i + 1, "title": f"Scene {i+1}", "target_duration_sec": max(8, duration_sec // 6)} for i in range(6)]
+    raw_scenes = data["scenes"]
 
     scenes = []
     base = max(6, duration_sec // max(5, min(7, len(raw_scenes))))
@@ -81,11 +121,28 @@ def _build_plan(genai_client, user_prompt: str, age: int, difficulty: int, durat
         scenes=scenes
     )
 
-def run_pipeline(user_prompt: str, age: int, difficulty: int, duration_sec: int, theme: str, out_dir: str, gen_images: bool, gen_audio: bool, burn_subs: bool, api_key: str) -> dict:
+def _write_trace(out_dir: str, result: dict):
+    tracer = current_tracer()
+    trace_path = os.path.join(out_dir, "trace.json")
+    tracer.write(trace_path)
+    result["trace_path"] = trace_path
+    result["trace"] = tracer.summary()
+
+@new_trace
+@_lesson_metrics
+def run_pipeline(user_prompt: str, age: int, difficulty: int, duration_sec: int, theme: str, out_dir: str, gen_images: bool, gen_audio: bool, burn_subs: bool, api_key: str, media_concurrency: int = MEDIA_CONCURRENCY, parallel_render: bool = True, single_pass: bool = False, soft_subs: bool = False, cache_dir: str = None, fresh: bool = False, rebuild: bool = False, streaming: bool = False, synthetic_placeholders: bool = False, stream_script: bool = False, render_profile: str = DEFAULT_PROFILE, hls: bool = False, genai_client=None, asset_cache=None, response_cache=None, plan: LessonPlan = None) -> dict:
+    started_at = time.perf_counter()
+    if render_profile not in RENDER_PROFILES:
+        raise ValueError(f"Unknown render profile: {render_profile}")
     os.makedirs(out_dir, exist_ok=True)
-    genai_client = GenAIClient(api_key=api_key)
+    genai_client = genai_client or get_client(api_key)
+    if asset_cache is None and cache_dir:
+        asset_cache = AssetCache(os.path.join(cache_dir, "assets"))
+    if response_cache is None and cache_dir:
+        response_cache = ResponseCache(os.path.join(cache_dir, "responses.sqlite"))
+
+    graph = StageGraph(out_dir, reuse=not rebuild)
 
-    plan = _build_plan(genai_client, user_prompt, age, difficulty, duration_sec, theme)
     plan_dir = os.path.join(out_dir, "plan")
     script_dir = os.path.join(out_dir, "script")
     media_dir = os.path.join(out_dir, "media")
@@ -94,61 +151,246 @@ def run_pipeline(user_prompt: str, age: int, difficulty: int, duration_sec: int,
     os.makedirs(media_dir, exist_ok=True)
 
     plan_path = os.path.join(plan_dir, "plan.json")
-    with open(plan_path, "w", encoding="utf-8") as f:
-        json.dump(plan.model_dump(), f, indent=2)
-
-    script = generate_script(genai_client, plan)
-    script_path = os.path.join(script_dir, "script.json")
-    with open(script_path, "w", encoding="utf-8") as f:
-        json.dump(script, f, indent=2)
+    plan_inputs = hash_inputs("plan", TEXT_MODEL, DIRECTOR_SYSTEM, user_prompt, age, difficulty, duration_sec, sanitize_theme(theme))
+    if plan is not None:
+        plan = plan.model_copy(update={"age": age, "difficulty": difficulty, "theme": sanitize_theme(theme)}, deep=True)
+        with open(plan_path, "w", encoding="utf-8") as f:
+            json.dump(plan.model_dump(), f, indent=2)
+        graph.record(plan_path, plan_inputs)
+        report("plan", "shared")
+    elif graph.is_fresh(plan_path, plan_inputs):
+        with open(plan_path, "r", encoding="utf-8") as f:
+            plan = LessonPlan.model_validate(json.load(f))
+        report("plan", "reused")
+    else:
+        report("plan", "running")
+        with span("build_plan"):
+            plan = _build_plan(genai_client, user_prompt, age, difficulty, duration_sec, theme, cache=response_cache, fresh=fresh)
+        with open(plan_path, "w", encoding="utf-8") as f:
+            json.dump(plan.model_dump(), f, indent=2)
+        graph.record(plan_path, plan_inputs)
+        report("plan", "done")
 
-    scenes = script["scenes"]
-    image_paths = []
-    audio_paths = []
+    hls_playlist = None
+    if hls and has_ffmpeg() and not single_pass:
+        hls_playlist = HlsPlaylist(out_dir, max((s.target_duration_sec for s in plan.scenes), default=10))
+        report("hls", "ready", path=hls_playlist.path)
 
-    if gen_images:
-        image_paths = generate_scene_images(genai_client, script, out_dir)
+    script_path = os.path.join(script_dir, "script.json")
+    script_inputs = hash_inputs("script", TEXT_MODEL, SCRIPT_SYSTEM, file_digest(plan_path))
+    streamed = None
+    if graph.is_fresh(script_path, script_inputs):
+        with open(script_path, "r", encoding="utf-8") as f:
+            script = json.load(f)
+        enforce_kid_safety(json.dumps(script))
+        report("script", "reused")
     else:
-        for s in scenes:
-            idx = int(s["index"])
-            image_paths.append(os.path.join(out_dir, f"scene_{idx:02d}.png"))
+        report("script", "running")
+        if stream_script and not single_pass:
+            pipeline = ScenePipeline(
+                genai_client, out_dir, gen_images, gen_audio,
+                render=has_ffmpeg(), max_workers=media_concurrency, cache=asset_cache, graph=graph,
+                synthetic=synthetic_placeholders, started_at=started_at, expected_scenes=len(plan.scenes), profile=render_profile, hls=hls_playlist
+            )
+            try:
+                with span("generate_script_stream"):
+                    script = generate_script_stream(genai_client, plan, pipeline.add_scene, cache=response_cache, fresh=fresh)
+            finally:
+                with span("scene_pipeline"):
+                    streamed = pipeline.finish()
+        else:
+            with span("generate_script"):
+                script = generate_script(genai_client, plan, cache=response_cache, fresh=fresh)
+        with open(script_path, "w", encoding="utf-8") as f:
+            json.dump(script, f, indent=2)
+        graph.record(script_path, script_inputs)
+        report("script", "done", scenes=len(script["scenes"]))
 
-    if gen_audio:
-        audio_paths = generate_scene_audio(genai_client, script, out_dir)
+    scenes = script["scenes"]
+    if streamed is not None:
+        image_paths, audio_paths = streamed["image_paths"], streamed["audio_paths"]
+    elif (streaming or stream_script) and not single_pass:
+        with span("scene_pipeline", scenes=len(scenes)):
+            streamed = run_scene_pipeline(
+                genai_client, script, out_dir, gen_images, gen_audio,
+                render=has_ffmpeg(), max_workers=media_concurrency, cache=asset_cache, graph=graph,
+                synthetic=synthetic_placeholders, started_at=started_at, profile=render_profile, hls=hls_playlist
+            )
+        image_paths, audio_paths = streamed["image_paths"], streamed["audio_paths"]
     else:
-        for s in scenes:
-            idx = int(s["index"])
-            audio_paths.append(os.path.join(out_dir, f"scene_{idx:02d}.wav"))
+        with span("media", scenes=len(scenes)):
+            image_paths, audio_paths = generate_scene_media(
+                genai_client, script, out_dir,
+                gen_images=gen_images, gen_audio=gen_audio, max_workers=media_concurrency, cache=asset_cache, graph=graph,
+                synthetic=synthetic_placeholders
+            )
 
     assets_path = write_asset_manifest(script, image_paths, audio_paths, out_dir)
-    from tools.env_utils import has_ffmpeg
-    
-    from tools.env_utils import has_ffmpeg
 
     assembled = None
     captions_srt = None
+    captions_vtt = None
     joined_video_path = None
     final_video_path = None
+    render_error = None
     
     if has_ffmpeg():
+        report("render", "running")
         try:
-            assembled = assemble(out_dir, script, assets_path, burn_subs)
+            with span("assemble"):
+                if streamed is not None:
+                    if streamed["scene_videos"] is None:
+                        raise RuntimeError(streamed["render_error"] or "scene render failed")
+                    srt_path, vtt_path = build_captions(out_dir, script, burn_subs, soft_subs)
+                    assembled = finish_video(out_dir, streamed["scene_videos"], srt_path, vtt_path, burn_subs, graph=graph, profile=render_profile)
+                else:
+                    assembled = assemble(out_dir, script, assets_path, burn_subs, parallel=parallel_render, single_pass=single_pass, soft_subs=soft_subs, graph=graph, profile=render_profile, hls=hls_playlist)
             captions_srt = assembled.get("captions_srt")
+            captions_vtt = assembled.get("captions_vtt")
             joined_video_path = assembled.get("joined_video")
             final_video_path = assembled.get("final_video")
-        except Exception:
+            report("render", "done")
+        except Exception as e:
             assembled = None
+            render_error = f"{type(e).__name__}: {e}"[:2000]
+            event("error.assemble", error=render_error)
+            report("render", "error", error=render_error)
+    else:
+        report("render", "skipped")
     
     result = {
         "plan": plan.model_dump(),
         "script": script,
         "assets_path": assets_path,
         "captions_srt": captions_srt,
+        "captions_vtt": captions_vtt,
         "joined_video_path": joined_video_path,
-        "final_video_path": final_video_path
+        "final_video_path": final_video_path,
+        "render_error": render_error,
+        "render_profile": render_profile,
+        "options": {
+            "gen_images": gen_images,
+            "gen_audio": gen_audio,
+            "burn_subs": burn_subs,
+            "soft_subs": soft_subs,
+            "single_pass": single_pass,
+            "synthetic_placeholders": synthetic_placeholders,
+            "render_profile": render_profile
+        },
+        "hls_playlist": hls_playlist.path if hls_playlist else None,
+        "asset_cache": asset_cache.stats() if asset_cache else None,
+        "response_cache": response_cache.stats() if response_cache else None,
+        "scene_timings": streamed["scene_timings"] if streamed else None,
+        "stages": graph.summary(),
+        "total_sec": round(time.perf_counter() - started_at, 3)
     }
-    
+
+    _write_trace(out_dir, result)
+
     result_path = os.path.join(out_dir, "result.json")
     with open(result_path, "w", encoding="utf-8") as f:
         json.dump(result, f, indent=2)
     return result
+
+SCENE_FIELDS = ("title", "narration", "on_screen_text", "visual_prompt", "quiz_prompt", "target_duration_sec")
+
+def _load_json(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+@new_trace
+def regenerate_scene(out_dir: str, index: int, overrides: dict = None, api_key: str = None, notes: str = None, fresh_media: bool = False, cache_dir: str = None, genai_client=None, asset_cache=None) -> dict:
+    started_at = time.perf_counter()
+    result_path = os.path.join(out_dir, "result.json")
+    result = _load_json(result_path)
+    options = result.get("options") or {}
+    gen_images = options.get("gen_images", True)
+    gen_audio = options.get("gen_audio", True)
+    burn_subs = options.get("burn_subs", bool(result.get("final_video_path")) and result.get("final_video_path") != result.get("joined_video_path") and not result.get("captions_vtt"))
+    soft_subs = options.get("soft_subs", bool(result.get("captions_vtt")))
+    synthetic = options.get("synthetic_placeholders", False)
+    profile = options.get("render_profile", result.get("render_profile", DEFAULT_PROFILE))
+
+    plan = LessonPlan.model_validate(_load_json(os.path.join(out_dir, "plan", "plan.json")))
+    script_path = os.path.join(out_dir, "script", "script.json")
+    script = _load_json(script_path)
+    positions = [i for i, s in enumerate(script["scenes"]) if int(s["index"]) == int(index)]
+    if not positions:
+        raise ValueError(f"No scene with index {index}")
+    pos = positions[0]
+
+    genai_client = genai_client or get_client(api_key)
+    if fresh_media:
+        asset_cache = None
+    elif asset_cache is None and cache_dir:
+        asset_cache = AssetCache(os.path.join(cache_dir, "assets"))
+    graph = StageGraph(out_dir)
+
+    edits = {k: v for k, v in (overrides or {}).items() if k in SCENE_FIELDS}
+    report("script", "running")
+    if edits:
+        scene = check_scene({**script["scenes"][pos], **edits})
+    elif fresh_media:
+        scene = check_scene(script["scenes"][pos])
+    else:
+        scene = rewrite_scene(genai_client, plan, script, pos, notes=notes)
+    script["scenes"][pos] = scene
+    with open(script_path, "w", encoding="utf-8") as f:
+        json.dump(script, f, indent=2)
+    report("script", "done", scene=int(index))
+
+    assets = _load_json(os.path.join(out_dir, "assets.json"))["scenes"]
+    image_paths = [a.get("image_path") for a in assets]
+    audio_paths = [a.get("audio_path") for a in assets]
+    idx = int(scene["index"])
+    if fresh_media:
+        for ext in (".png", ".wav"):
+            graph.forget(os.path.join(out_dir, f"scene_{idx:02d}{ext}"))
+    prompt = checked_image_prompts([scene], gen_images, gen_audio)[0]
+    with span("media", scenes=1):
+        if gen_images:
+            image_paths[pos] = generate_scene_image(genai_client, scene, prompt, out_dir, asset_cache, graph, synthetic)
+        if gen_audio:
+            audio_paths[pos] = generate_scene_narration(genai_client, scene, out_dir, asset_cache, graph, synthetic)
+    assets_path = write_asset_manifest(script, image_paths, audio_paths, out_dir)
+
+    render_error = None
+    assembled = {}
+    if has_ffmpeg():
+        report("render", "running")
+        hls_playlist = HlsPlaylist(out_dir) if result.get("hls_playlist") else None
+        try:
+            with span("assemble"):
+                asset_scenes = _load_json(assets_path)["scenes"]
+                srt_path, vtt_path = build_captions(out_dir, script, burn_subs, soft_subs)
+                scene_videos = render_scenes(asset_scenes, out_dir, graph=graph, profile=profile, hls=hls_playlist)
+                assembled = finish_video(out_dir, scene_videos, srt_path, vtt_path, burn_subs, graph=graph, profile=profile)
+        except Exception as e:
+            render_error = f"{type(e).__name__}: {e}"[:2000]
+            event("error.assemble", error=render_error)
+        finally:
+            if hls_playlist is not None:
+                hls_playlist.finish()
+        report("render", "error" if render_error else "done")
+
+    result.update({
+        "script": script,
+        "assets_path": assets_path,
+        "captions_srt": assembled.get("captions_srt", result.get("captions_srt")),
+        "captions_vtt": assembled.get("captions_vtt", result.get("captions_vtt")),
+        "joined_video_path": assembled.get("joined_video", result.get("joined_video_path")),
+        "final_video_path": assembled.get("final_video", result.get("final_video_path")),
+        "render_error": render_error
+    })
+    result["last_regeneration"] = {
+        "index": idx,
+        "edited_fields": sorted(edits),
+        "rewritten": not edits and not fresh_media,
+        "stages": graph.summary(),
+        "total_sec": round(time.perf_counter() - started_at, 3)
+    }
+    _write_trace(out_dir, result)
+    result["last_regeneration"]["trace"] = result["trace"]
+    with open(result_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    return result
@@ -0,0 +1,134 @@
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from core.director import run_pipeline
+from tools.asset_cache import write_atomic
+from tools.progress import reporting
+from tools.metrics import gauge
+from tools.tracing import event
+
+STATUS_NAME = "status.json"
+ACTIVE_STATES = ("queued", "running")
+PRIVATE_KWARGS = ("api_key",)
+ONE_SHOT_KWARGS = ("fresh", "rebuild")
+
+JOBS = gauge("unfold_jobs", "Lesson jobs in the app runner by state", ("state",))
+
+def status_path(out_dir: str) -> str:
+    return os.path.join(out_dir, STATUS_NAME)
+
+def read_status(out_dir: str) -> dict:
+    try:
+        with open(status_path(out_dir), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _request_record(kwargs: dict) -> dict:
+    return {
+        k: v for k, v in kwargs.items()
+        if k not in PRIVATE_KWARGS and isinstance(v, (str, int, float, bool, type(None)))
+    }
+
+def resubmit_kwargs(request: dict, **overrides) -> dict:
+    kwargs = {k: v for k, v in request.items() if k not in ONE_SHOT_KWARGS}
+    kwargs.update(overrides)
+    return kwargs
+
+class JobStatus:
+    def __init__(self, run_id: str, out_dir: str, request: dict = None):
+        self.out_dir = out_dir
+        self.data = {
+            "run_id": run_id,
+            "out_dir": out_dir,
+            "state": "queued",
+            "submitted_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "current": None,
+            "stages": {},
+            "error": None,
+            "result_path": None,
+            "request": request or {}
+        }
+        self._lock = threading.Lock()
+        self.save()
+
+    def save(self):
+        with self._lock:
+            payload = json.dumps(self.data, indent=2).encode("utf-8")
+            write_atomic(status_path(self.out_dir), payload)
+
+    def update(self, stage: str, status: str, info: dict = None):
+        with self._lock:
+            entry = self.data["stages"].setdefault(stage, {})
+            entry["status"] = status
+            entry["t"] = round(time.time() - (self.data["started_at"] or self.data["submitted_at"]), 3)
+            if info:
+                entry.update(info)
+            self.data["current"] = stage
+        self.save()
+
+    def set_state(self, state: str, **fields):
+        with self._lock:
+            self.data["state"] = state
+            self.data.update(fields)
+        self.save()
+
+class JobRunner:
+    def __init__(self, max_jobs: int = 2, on_done=None):
+        self.max_jobs = max(1, int(max_jobs))
+        self.on_done = on_done
+        self.pool = ThreadPoolExecutor(max_workers=self.max_jobs, thread_name_prefix="lesson-job")
+        self.futures = {}
+        self._lock = threading.Lock()
+
+    def submit(self, run_id: str, out_dir: str, target=None, request: dict = None, **kwargs) -> dict:
+        os.makedirs(out_dir, exist_ok=True)
+        with self._lock:
+            self.futures = {k: f for k, f in self.futures.items() if not f.done()}
+            if run_id in self.futures:
+                return read_status(out_dir)
+            status = JobStatus(run_id, out_dir, request if request is not None else _request_record(kwargs))
+            JOBS.inc(state="queued")
+            self.futures[run_id] = self.pool.submit(self._run, status, out_dir, target or run_pipeline, kwargs)
+        return status.data
+
+    def _run(self, status: JobStatus, out_dir: str, target, kwargs: dict) -> dict:
+        JOBS.dec(state="queued")
+        status.set_state("running", started_at=time.time())
+        try:
+            with reporting(status.update), JOBS.track(state="running"):
+                result = target(out_dir=out_dir, **kwargs)
+        except Exception as e:
+            status.set_state("error", finished_at=time.time(), error=f"{type(e).__name__}: {e}"[:2000])
+            raise
+        status.set_state("done", finished_at=time.time(), result_path=os.path.join(out_dir, "result.json"))
+        if self.on_done is not None:
+            try:
+                self.on_done(out_dir)
+            except Exception as e:
+                event("error.on_done", error=f"{type(e).__name__}: {e}"[:500])
+        return result
+
+    def is_active(self, run_id: str) -> bool:
+        with self._lock:
+            fut = self.futures.get(run_id)
+        return fut is not None and not fut.done()
+
+    def active_ids(self) -> list:
+        with self._lock:
+            return [k for k, f in self.futures.items() if not f.done()]
+
+    def active_count(self) -> int:
+        with self._lock:
+            return sum(1 for f in self.futures.values() if not f.done())
+
+    def status(self, run_id: str, out_dir: str) -> dict:
+        active = self.is_active(run_id)
+        data = read_status(out_dir)
+        if data and data["state"] in ACTIVE_STATES and not active:
+            data["state"] = "lost"
+        return data
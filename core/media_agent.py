@@ -2,14 +2,28 @@ import os
 import json
 import wave
 import struct
-from core.safety import enforce_kid_safety
+from concurrent.futures import ThreadPoolExecutor
+from core.safety import enforce_kid_safety_batch
 from tools.placeholders import solid_png
+from tools.asset_cache import write_atomic
+from tools.genai_client import IMAGE_MODEL, AUDIO_MODEL, AUDIO_INSTRUCTION
+from core.stage_graph import hash_inputs
+from tools.tracing import event, submit
+from tools.metrics import counter
+from tools.response_cache import CACHE_LOOKUPS
+from tools.progress import report
 
 IMAGE_STYLE = (
     "Kid-friendly colorful 2D cartoon style, clean outlines, simple shapes, "
     "safe and wholesome, no scary imagery, no weapons violence, no romance."
 )
 
+# None sizes the pool to one worker per image and narration call (2 x scenes);
+# the process-wide cap on in-flight API calls is set_api_concurrency.
+MEDIA_CONCURRENCY = None
+
+MEDIA_FALLBACKS = counter("unfold_media_fallbacks_total", "Scenes whose image or narration fell back to a placeholder", ("kind",))
+
 def _write_silence_wav(path: str, duration_sec: float, sample_rate: int = 22050):
     nframes = int(duration_sec * sample_rate)
     with wave.open(path, "w") as wf:
@@ -19,55 +33,148 @@ def _write_silence_wav(path: str, duration_sec: float, sample_rate: int = 22050)
         silence = struct.pack("<h", 0)
         wf.writeframes(silence * nframes)
 
-def generate_scene_images(genai_client, script: dict, out_dir: str) -> list:
-    scenes = script["scenes"]
-    paths = []
-    for s in scenes:
-        idx = int(s["index"])
-        prompt = f"{IMAGE_STYLE}\nTheme: {s.get('title','')}\nScene: {s.get('visual_prompt','')}"
-        enforce_kid_safety(prompt)
-        p = os.path.join(out_dir, f"scene_{idx:02d}.png")
+def media_workers(scenes: int, max_workers: int = None) -> int:
+    return max(1, int(max_workers)) if max_workers else max(1, 2 * scenes)
+
+def _image_prompt(s: dict) -> str:
+    return f"{IMAGE_STYLE}\nTheme: {s.get('title','')}\nScene: {s.get('visual_prompt','')}"
+
+def checked_image_prompts(scenes: list, gen_images: bool, gen_audio: bool) -> list:
+    prompts = [_image_prompt(s) for s in scenes]
+    fields = []
+    for s, prompt in zip(scenes, prompts):
+        if gen_images:
+            fields.append((f"scene {s.get('index')} image prompt", prompt))
+        if gen_audio:
+            fields.append((f"scene {s.get('index')} narration", s.get("narration", "")))
+    enforce_kid_safety_batch(fields)
+    return prompts
+
+def _drop_placeholder(path: str, graph=None):
+    if os.path.lexists(path):
+        os.remove(path)
+    if graph is not None:
+        graph.forget(path)
+
+def generate_scene_image(genai_client, s: dict, prompt: str, out_dir: str, cache=None, graph=None, synthetic: bool = False) -> str:
+    idx = int(s["index"])
+    p = os.path.join(out_dir, f"scene_{idx:02d}.png")
+    stage = f"scene_{idx:02d}.image"
+    inputs = hash_inputs("image", IMAGE_MODEL, prompt)
+    if graph is not None and graph.is_fresh(p, inputs):
+        report(stage, "reused")
+        return p
+    key = None
+    if cache is not None:
+        key = cache.key(IMAGE_MODEL, prompt, IMAGE_STYLE)
+        hit = cache.fetch(key, ".png", p)
+        CACHE_LOOKUPS.inc(cache="image", result="hit" if hit else "miss")
+        if hit:
+            if graph is not None:
+                graph.record(p, inputs)
+            report(stage, "cached")
+            return p
+    report(stage, "running")
+    img_bytes = None
+    try:
+        img_bytes = genai_client.generate_image(prompt=prompt)
+    except Exception as e:
         img_bytes = None
-        try:
-            img_bytes = genai_client.generate_image(prompt=prompt)
-        except Exception:
-            img_bytes = solid_png()
-        with open(p, "wb") as f:
-            f.write(img_bytes)
-        paths.append(p)
-    return paths
+        event("fallback.image", index=idx, error=f"{type(e).__name__}: {e}"[:500])
+    else:
+        if not img_bytes:
+            event("fallback.image", index=idx, error="No image bytes returned")
+    report(stage, "done" if img_bytes else "fallback")
+    if not img_bytes:
+        MEDIA_FALLBACKS.inc(kind="image")
+    if not img_bytes and synthetic:
+        _drop_placeholder(p, graph)
+        return None
+    if img_bytes and cache is not None:
+        cache.store(key, ".png", img_bytes, dest=p)
+    else:
+        write_atomic(p, img_bytes or solid_png())
+    if graph is not None:
+        if img_bytes:
+            graph.record(p, inputs)
+        else:
+            graph.forget(p)
+    return p
 
-def generate_scene_audio(genai_client, script: dict, out_dir: str) -> list:
-    scenes = script["scenes"]
-    paths = []
-    for s in scenes:
-        idx = int(s["index"])
-        narration = s.get("narration", "")
-        enforce_kid_safety(narration)
-        p = os.path.join(out_dir, f"scene_{idx:02d}.wav")
-        duration = float(s.get("target_duration_sec", 10))
+def generate_scene_narration(genai_client, s: dict, out_dir: str, cache=None, graph=None, synthetic: bool = False) -> str:
+    idx = int(s["index"])
+    narration = s.get("narration", "")
+    p = os.path.join(out_dir, f"scene_{idx:02d}.wav")
+    stage = f"scene_{idx:02d}.audio"
+    duration = float(s.get("target_duration_sec", 10))
+    inputs = hash_inputs("audio", AUDIO_MODEL, AUDIO_INSTRUCTION, narration)
+    if graph is not None and graph.is_fresh(p, inputs):
+        report(stage, "reused")
+        return p
+    key = None
+    if cache is not None:
+        key = cache.key(AUDIO_MODEL, narration, AUDIO_INSTRUCTION)
+        hit = cache.fetch(key, ".wav", p)
+        CACHE_LOOKUPS.inc(cache="audio", result="hit" if hit else "miss")
+        if hit:
+            if graph is not None:
+                graph.record(p, inputs)
+            report(stage, "cached")
+            return p
+    report(stage, "running")
+    audio_bytes = None
+    try:
+        audio_bytes = genai_client.generate_audio(text=narration)
+    except Exception as e:
         audio_bytes = None
-        try:
-            audio_bytes = genai_client.generate_audio(text=narration)
-        except Exception:
-            audio_bytes = None
+        event("fallback.audio", index=idx, error=f"{type(e).__name__}: {e}"[:500])
+    else:
+        if not audio_bytes:
+            event("fallback.audio", index=idx, error="No audio bytes returned")
+    report(stage, "done" if audio_bytes else "fallback")
+    if not audio_bytes:
+        MEDIA_FALLBACKS.inc(kind="audio")
+    if not audio_bytes and synthetic:
+        _drop_placeholder(p, graph)
+        return None
+    if audio_bytes and cache is not None:
+        cache.store(key, ".wav", audio_bytes, dest=p)
+    elif audio_bytes:
+        write_atomic(p, audio_bytes)
+    else:
+        if os.path.lexists(p):
+            os.remove(p)
+        _write_silence_wav(p, duration_sec=duration)
+    if graph is not None:
         if audio_bytes:
-            with open(p, "wb") as f:
-                f.write(audio_bytes)
+            graph.record(p, inputs)
         else:
-            _write_silence_wav(p, duration_sec=duration)
-        paths.append(p)
-    return paths
+            graph.forget(p)
+    return p
+
+def generate_scene_media(genai_client, script: dict, out_dir: str, gen_images: bool = True, gen_audio: bool = True, max_workers: int = MEDIA_CONCURRENCY, cache=None, graph=None, synthetic: bool = False) -> tuple:
+    scenes = script["scenes"]
+    prompts = checked_image_prompts(scenes, gen_images, gen_audio)
+    with ThreadPoolExecutor(max_workers=media_workers(len(scenes), max_workers)) as pool:
+        image_futs = [submit(pool, generate_scene_image, genai_client, s, prompts[i], out_dir, cache, graph, synthetic) for i, s in enumerate(scenes)] if gen_images else []
+        audio_futs = [submit(pool, generate_scene_narration, genai_client, s, out_dir, cache, graph, synthetic) for s in scenes] if gen_audio else []
+        image_paths = [f.result() for f in image_futs] if gen_images else [None] * len(scenes)
+        audio_paths = [f.result() for f in audio_futs] if gen_audio else [None] * len(scenes)
+    return image_paths, audio_paths
 
 def write_asset_manifest(script: dict, image_paths: list, audio_paths: list, out_dir: str) -> str:
     scenes = script["scenes"]
     manifest = []
     for i, s in enumerate(scenes):
         idx = int(s["index"])
+        image_path = image_paths[i] if i < len(image_paths) else None
+        audio_path = audio_paths[i] if i < len(audio_paths) else None
         manifest.append({
             "index": idx,
-            "image_path": image_paths[i] if i < len(image_paths) else None,
-            "audio_path": audio_paths[i] if i < len(audio_paths) else None,
+            "image_path": image_path,
+            "audio_path": audio_path,
+            "image_synthetic": image_path is None,
+            "audio_synthetic": audio_path is None,
             "target_duration_sec": int(s.get("target_duration_sec", 10))
         })
     path = os.path.join(out_dir, "assets.json")
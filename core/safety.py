@@ -1,12 +1,95 @@
+import os
+import re
+from bisect import bisect_right
+from functools import lru_cache
+
+# Terms match whole words only; a trailing * also matches longer words (porn* -> pornography).
+BLOCKED_TERMS = (
+    "sex", "sexes", "sexual*", "sexy", "sexier", "sexiest", "sext", "sexts", "sexted", "sexting",
+    "nude", "nudes", "naked", "porn*", "hookup*", "blowjob", "handjob",
+    "rape", "raped", "raping", "rapist", "molest*", "groom*", "tease 8 year old", "past tease", "past tease 8"
+)
+LEXICON_ENV = "UNFOLD_SAFETY_LEXICON"
+
+def _normalize(term: str) -> str:
+    return " ".join((term or "").lower().split())
+
+def load_lexicon(path: str) -> list:
+    terms = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                terms.append(line)
+    return terms
+
+def _trie_regex(terms: list) -> str:
+    trie = {}
+    for t in terms:
+        node = trie
+        for ch in t:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node: dict) -> str:
+        alts = [(r"\s+" if ch == " " else re.escape(ch)) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        if len(alts) == 1 and "" not in node:
+            return alts[0]
+        return "(?:" + "|".join(alts) + ")" + ("?" if "" in node else "")
+
+    return emit(trie)
+
+class SafetyMatcher:
+    def __init__(self, terms):
+        self.terms = sorted({_normalize(t) for t in terms} - {"", "*"})
+        words = [t for t in self.terms if not t.endswith("*")]
+        stems = [t[:-1].rstrip() for t in self.terms if t.endswith("*")]
+        alts = ([f"(?:{_trie_regex(words)})(?!\\w)"] if words else []) + ([_trie_regex(stems)] if stems else [])
+        self.pattern = re.compile(r"(?<!\w)(" + ("|".join(alts) or "(?!)") + ")")
+        self.first_match = lru_cache(maxsize=4096)(self._first_match)
+
+    def _first_match(self, text: str):
+        m = self.pattern.search((text or "").lower())
+        return _normalize(m.group(1)) if m else None
+
+    def find_all(self, fields) -> list:
+        items = list(fields.items() if isinstance(fields, dict) else fields)
+        starts = []
+        parts = []
+        pos = 0
+        for _, text in items:
+            text = (text or "").lower().replace("\x00", " ")
+            starts.append(pos)
+            parts.append(text)
+            pos += len(text) + 1
+        hits = []
+        for m in self.pattern.finditer("\x00".join(parts)):
+            field = items[bisect_right(starts, m.start()) - 1][0]
+            hits.append({"field": field, "term": _normalize(m.group(1))})
+        return hits
+
+@lru_cache(maxsize=1)
+def default_matcher() -> SafetyMatcher:
+    terms = list(BLOCKED_TERMS)
+    path = os.getenv(LEXICON_ENV, "").strip()
+    if path:
+        terms += load_lexicon(path)
+    return SafetyMatcher(terms)
+
 def enforce_kid_safety(text: str) -> None:
-    t = (text or "").lower()
-    blocked = [
-        "sex", "sexy", "nude", "naked", "porn", "hookup", "blowjob", "handjob",
-        "rape", "molest", "groom", "tease 8 year old", "past tease", "past tease 8"
-    ]
-    for b in blocked:
-        if b in t:
-            raise ValueError("Unsafe content detected")
+    term = default_matcher().first_match(text or "")
+    if term:
+        raise ValueError(f"Unsafe content detected: {term!r}")
+
+def find_unsafe(fields) -> list:
+    return default_matcher().find_all(fields)
+
+def enforce_kid_safety_batch(fields) -> None:
+    hits = find_unsafe(fields)
+    if hits:
+        raise ValueError(f"Unsafe content detected in {hits[0]['field']}: {hits[0]['term']!r}")
 
 def sanitize_theme(theme: str) -> str:
     theme = (theme or "").strip()
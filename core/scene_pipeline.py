@@ -0,0 +1,122 @@
+import time
+import queue
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from core.media_agent import checked_image_prompts, generate_scene_image, generate_scene_narration, media_workers, MEDIA_CONCURRENCY
+from core.assembler import render_scene
+from tools.ffmpeg_render import render_slots
+from tools.tracing import event, submit
+from tools.metrics import gauge
+
+READY_SCENES = gauge("unfold_scene_render_queue", "Scenes with media ready and waiting for a render worker")
+
+class ScenePipeline:
+    def __init__(self, genai_client, out_dir: str, gen_images: bool, gen_audio: bool, render: bool = True, max_workers: int = MEDIA_CONCURRENCY, max_jobs: int = None, cache=None, graph=None, synthetic: bool = False, started_at: float = None, expected_scenes: int = 7, profile: str = None, hls=None):
+        self.genai_client = genai_client
+        self.out_dir = out_dir
+        self.gen_images = gen_images
+        self.gen_audio = gen_audio
+        self.cache = cache
+        self.graph = graph
+        self.synthetic = synthetic
+        self.profile = profile
+        self.hls = hls
+        self.t0 = started_at if started_at is not None else time.perf_counter()
+
+        self.image_paths = []
+        self.audio_paths = []
+        self.scene_videos = []
+        self.timings = []
+        self.errors = []
+        self._futs = []
+        self._lock = threading.Lock()
+
+        workers, self.threads = render_slots(max(1, expected_scenes), max_jobs)
+        self.ready = queue.PriorityQueue(maxsize=workers * 2) if render else None
+        self.pool = ThreadPoolExecutor(max_workers=media_workers(expected_scenes, max_workers))
+        self.consumers = []
+        if self.ready is not None:
+            for _ in range(workers):
+                t = threading.Thread(target=contextvars.copy_context().run, args=(self._consume,), daemon=True)
+                t.start()
+                self.consumers.append(t)
+
+    def _elapsed(self) -> float:
+        return round(time.perf_counter() - self.t0, 3)
+
+    def add_scene(self, s: dict):
+        prompt = checked_image_prompts([s], self.gen_images, self.gen_audio)[0]
+        with self._lock:
+            i = len(self.timings)
+            self.image_paths.append(None)
+            self.audio_paths.append(None)
+            self.scene_videos.append(None)
+            self.timings.append({"index": int(s["index"]), "queued": self._elapsed()})
+        self._futs.append(submit(self.pool, self._produce, i, s, prompt))
+
+    def _produce(self, i: int, s: dict, prompt: str):
+        timings = self.timings[i]
+        timings["started"] = self._elapsed()
+        if self.gen_images:
+            self.image_paths[i] = generate_scene_image(self.genai_client, s, prompt, self.out_dir, self.cache, self.graph, self.synthetic)
+        timings["image_ready"] = self._elapsed()
+        if self.gen_audio:
+            self.audio_paths[i] = generate_scene_narration(self.genai_client, s, self.out_dir, self.cache, self.graph, self.synthetic)
+        timings["audio_ready"] = self._elapsed()
+        if self.ready is not None:
+            READY_SCENES.inc()
+            self.ready.put((i, {
+                "index": int(s["index"]),
+                "image_path": self.image_paths[i],
+                "audio_path": self.audio_paths[i],
+                "image_synthetic": self.image_paths[i] is None,
+                "audio_synthetic": self.audio_paths[i] is None,
+                "target_duration_sec": int(s.get("target_duration_sec", 10))
+            }))
+
+    def _consume(self):
+        while True:
+            i, entry = self.ready.get()
+            if entry is None:
+                return
+            READY_SCENES.dec()
+            try:
+                self.scene_videos[i] = render_scene(entry, self.out_dir, self.threads, self.graph, self.profile, self.hls, i)
+                self.timings[i]["segment_ready"] = self._elapsed()
+            except Exception as e:
+                self.errors.append(e)
+                event("error.render_scene", index=entry["index"], error=f"{type(e).__name__}: {e}"[:500])
+
+    def finish(self) -> dict:
+        try:
+            for f in self._futs:
+                f.result()
+        finally:
+            self.pool.shutdown(wait=True)
+            for _ in self.consumers:
+                self.ready.put((float("inf"), None))
+            for t in self.consumers:
+                t.join()
+            if self.hls is not None:
+                self.hls.finish()
+
+        render = self.ready is not None
+        return {
+            "image_paths": self.image_paths,
+            "audio_paths": self.audio_paths,
+            "scene_videos": self.scene_videos if render and not self.errors else None,
+            "render_error": str(self.errors[0]) if self.errors else None,
+            "scene_timings": self.timings
+        }
+
+def run_scene_pipeline(genai_client, script: dict, out_dir: str, gen_images: bool, gen_audio: bool, render: bool = True, max_workers: int = MEDIA_CONCURRENCY, max_jobs: int = None, cache=None, graph=None, synthetic: bool = False, started_at: float = None, profile: str = None, hls=None) -> dict:
+    scenes = script["scenes"]
+    checked_image_prompts(scenes, gen_images, gen_audio)
+    pipeline = ScenePipeline(
+        genai_client, out_dir, gen_images, gen_audio, render=render, max_workers=max_workers, max_jobs=max_jobs,
+        cache=cache, graph=graph, synthetic=synthetic, started_at=started_at, expected_scenes=len(scenes), profile=profile, hls=hls
+    )
+    for s in scenes:
+        pipeline.add_scene(s)
+    return pipeline.finish()
@@ -1,5 +1,5 @@
 from typing import List, Optional
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
 
 class Scene(BaseModel):
     index: int
@@ -10,6 +10,20 @@ class Scene(BaseModel):
     quiz_prompt: Optional[str] = None
     target_duration_sec: int = Field(ge=3, le=60)
 
+class ScriptDraft(BaseModel):
+    scenes: List[Scene]
+
+class PlanSceneDraft(BaseModel):
+    index: int
+    title: str
+    target_duration_sec: int
+
+class PlanDraft(BaseModel):
+    topic: str
+    learning_goals: List[str]
+    safety_rules: List[str]
+    scenes: List[PlanSceneDraft] = Field(min_length=5)
+
 class LessonPlan(BaseModel):
     age: int = Field(ge=7, le=12)
     difficulty: int = Field(ge=1, le=5)
@@ -19,3 +33,6 @@ class LessonPlan(BaseModel):
     learning_goals: List[str]
     safety_rules: List[str]
     scenes: List[Scene]
+
+def validation_summary(e: ValidationError, limit: int = 500) -> str:
+    return "; ".join(f"{'.'.join(str(x) for x in err['loc'])}: {err['msg']}" for err in e.errors())[:limit]
@@ -1,7 +1,10 @@
 import json
-from core.schemas import LessonPlan
+from pydantic import ValidationError
+from core.schemas import LessonPlan, Scene, ScriptDraft, validation_summary
 from core.safety import enforce_kid_safety
-from tools.json_utils import extract_json
+from tools.json_utils import extract_json, ArrayItemParser
+from tools.response_cache import generate_validated, lookup_validated
+from tools.tracing import span, event
 
 SCRIPT_SYSTEM = (
     "Return ONLY valid JSON. No markdown. No backticks. No prose. "
@@ -11,7 +14,104 @@ SCRIPT_SYSTEM = (
     "Output must be an object with key 'scenes' only."
 )
 
-def generate_script(genai_client, plan: LessonPlan) -> dict:
+REPAIR_ROUNDS = 2
+
+def _validate_script(text: str) -> dict:
+    enforce_kid_safety(text)
+    data = extract_json(text)
+    if "scenes" not in data or not isinstance(data["scenes"], list):
+        raise ValueError("Bad script JSON")
+    return data
+
+def _scene_index(raw, position: int) -> int:
+    idx = raw.get("index") if isinstance(raw, dict) else None
+    return idx if isinstance(idx, int) and not isinstance(idx, bool) else position + 1
+
+def check_scene(raw) -> dict:
+    s = Scene.model_validate(raw).model_dump()
+    enforce_kid_safety(json.dumps(s))
+    return s
+
+def _repair_request(plan: LessonPlan, raw_scenes: list, invalid: dict) -> str:
+    user_msg = {
+        "plan": plan.model_dump(),
+        "scenes_to_fix": [
+            {"index": _scene_index(raw_scenes[pos], pos), "draft": raw_scenes[pos], "errors": err}
+            for pos, err in sorted(invalid.items())
+        ],
+        "rules": [
+            "Return ONLY JSON.",
+            "Top-level keys: scenes only.",
+            "Return exactly one corrected scene per item in scenes_to_fix, in the same order, keeping its index.",
+            "Each scene must include: index, title, narration, on_screen_text, visual_prompt, quiz_prompt (nullable), target_duration_sec (int 3..60).",
+            "on_screen_text must be under 8 words."
+        ]
+    }
+    return json.dumps(user_msg)
+
+def repair_scenes(genai_client, plan: LessonPlan, raw_scenes: list, rounds: int = REPAIR_ROUNDS) -> list:
+    scenes = [None] * len(raw_scenes)
+    invalid = {}
+    for pos, raw in enumerate(raw_scenes):
+        try:
+            scenes[pos] = check_scene(raw)
+        except ValidationError as e:
+            invalid[pos] = validation_summary(e)
+
+    for attempt in range(rounds):
+        if not invalid:
+            break
+        event("script.repair", attempt=attempt, scenes=[_scene_index(raw_scenes[p], p) for p in sorted(invalid)])
+        try:
+            with span("script.repair", scenes=len(invalid)):
+                text = genai_client.generate_text(system=SCRIPT_SYSTEM, user=_repair_request(plan, raw_scenes, invalid), response_schema=ScriptDraft)
+            fixed = _validate_script(text)["scenes"]
+        except (ValueError, RuntimeError) as e:
+            event("error.script_repair", attempt=attempt, error=f"{type(e).__name__}: {e}"[:500])
+            continue
+        by_index = {f.get("index"): f for f in fixed if isinstance(f, dict)}
+        for n, pos in enumerate(sorted(invalid)):
+            idx = _scene_index(raw_scenes[pos], pos)
+            cand = by_index.get(idx) or (fixed[n] if n < len(fixed) and isinstance(fixed[n], dict) else None)
+            if cand is None:
+                continue
+            cand = {**cand, "index": idx}
+            try:
+                scenes[pos] = check_scene(cand)
+            except ValidationError as e:
+                raw_scenes[pos] = cand
+                invalid[pos] = validation_summary(e)
+            else:
+                del invalid[pos]
+
+    if invalid:
+        detail = ", ".join(f"scene {_scene_index(raw_scenes[p], p)} ({err})" for p, err in sorted(invalid.items()))
+        raise ValueError(f"Invalid script scenes after repair: {detail}"[:2000])
+    return scenes
+
+def rewrite_scene(genai_client, plan: LessonPlan, script: dict, position: int, notes: str = None) -> dict:
+    current = script["scenes"][position]
+    user_msg = {
+        "plan": plan.model_dump(),
+        "lesson_scenes": [{"index": s.get("index"), "title": s.get("title")} for s in script["scenes"]],
+        "scene_to_rewrite": current,
+        "notes": notes or "Make this scene clearer and more engaging.",
+        "rules": [
+            "Return ONLY JSON.",
+            "Top-level keys: scenes only, holding exactly one scene.",
+            "Keep the same index and roughly the same target_duration_sec.",
+            "Each scene must include: index, title, narration, on_screen_text, visual_prompt, quiz_prompt (nullable), target_duration_sec (int 3..60).",
+            "on_screen_text must be under 8 words."
+        ]
+    }
+    with span("script.rewrite_scene", index=current.get("index")):
+        text = genai_client.generate_text(system=SCRIPT_SYSTEM, user=json.dumps(user_msg), response_schema=ScriptDraft)
+    scenes = _validate_script(text)["scenes"]
+    if not scenes or not isinstance(scenes[0], dict):
+        raise ValueError("Rewrite returned no scene")
+    return repair_scenes(genai_client, plan, [{**scenes[0], "index": current.get("index")}])[0]
+
+def _script_request(plan: LessonPlan) -> str:
     plan_json = plan.model_dump()
     enforce_kid_safety(json.dumps(plan_json))
     user_msg = {
@@ -26,9 +126,48 @@ def generate_script(genai_client, plan: LessonPlan) -> dict:
             "Keep language appropriate for the given age."
         ]
     }
-    text = genai_client.generate_text(system=SCRIPT_SYSTEM, user=json.dumps(user_msg))
-    enforce_kid_safety(text)
-    data = extract_json(text)
-    if "scenes" not in data or not isinstance(data["scenes"], list):
-        raise ValueError("Bad script JSON")
+    return json.dumps(user_msg)
+
+def generate_script(genai_client, plan: LessonPlan, cache=None, fresh: bool = False) -> dict:
+    return generate_validated(
+        genai_client, SCRIPT_SYSTEM, _script_request(plan), _validate_script, cache=cache, fresh=fresh,
+        response_schema=ScriptDraft, repair=lambda data: {**data, "scenes": repair_scenes(genai_client, plan, data["scenes"])}
+    )
+
+def generate_script_stream(genai_client, plan: LessonPlan, on_scene, cache=None, fresh: bool = False) -> dict:
+    user = _script_request(plan)
+    key, data = lookup_validated(cache, SCRIPT_SYSTEM, user, _validate_script, fresh=fresh)
+    if data is not None:
+        data["scenes"] = repair_scenes(genai_client, plan, data["scenes"])
+        for s in data["scenes"]:
+            on_scene(s)
+        return data
+
+    stream = getattr(genai_client, "generate_text_stream", None)
+    if stream is not None:
+        chunks = stream(system=SCRIPT_SYSTEM, user=user, response_schema=ScriptDraft)
+    else:
+        chunks = [genai_client.generate_text(system=SCRIPT_SYSTEM, user=user, response_schema=ScriptDraft)]
+
+    parser = ArrayItemParser("scenes")
+    emitted = 0
+    held = False
+    for chunk in chunks:
+        for raw in parser.feed(chunk):
+            if held:
+                continue
+            try:
+                s = check_scene(raw)
+            except ValidationError:
+                held = True
+                continue
+            on_scene(s)
+            emitted += 1
+
+    data = _validate_script(parser.text)
+    data["scenes"] = repair_scenes(genai_client, plan, data["scenes"])
+    for s in data["scenes"][emitted:]:
+        on_scene(s)
+    if key:
+        cache.put(key, json.dumps(data, ensure_ascii=False))
     return data
@@ -0,0 +1,62 @@
+import os
+import json
+import hashlib
+import threading
+from tools.asset_cache import write_atomic
+
+MANIFEST_NAME = "build_manifest.json"
+
+def hash_inputs(*parts) -> str:
+    payload = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class StageGraph:
+    def __init__(self, out_dir: str, reuse: bool = True):
+        self.out_dir = out_dir
+        self.path = os.path.join(out_dir, MANIFEST_NAME)
+        self.nodes = {}
+        self.rebuilt = []
+        self.reused = []
+        self._lock = threading.Lock()
+        if reuse and os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.nodes = json.load(f).get("nodes", {})
+            except Exception:
+                self.nodes = {}
+
+    def _rel(self, path: str) -> str:
+        return os.path.relpath(path, self.out_dir).replace(os.sep, "/")
+
+    def inputs_of(self, path: str):
+        node = self.nodes.get(self._rel(path))
+        return node["inputs"] if node else None
+
+    def is_fresh(self, path: str, inputs: str) -> bool:
+        rel = self._rel(path)
+        with self._lock:
+            node = self.nodes.get(rel)
+            fresh = bool(node) and node.get("inputs") == inputs and os.path.exists(path)
+            if fresh:
+                self.reused.append(rel)
+        return fresh
+
+    def record(self, path: str, inputs: str):
+        rel = self._rel(path)
+        with self._lock:
+            self.nodes[rel] = {"inputs": inputs}
+            self.rebuilt.append(rel)
+            self._save()
+
+    def forget(self, path: str):
+        with self._lock:
+            if self.nodes.pop(self._rel(path), None) is not None:
+                self._save()
+
+    def _save(self):
+        data = json.dumps({"nodes": self.nodes}, indent=2, sort_keys=True)
+        write_atomic(self.path, data.encode("utf-8"))
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {"rebuilt": sorted(self.rebuilt), "reused": sorted(self.reused)}
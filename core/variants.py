@@ -0,0 +1,146 @@
+import os
+import json
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from core.director import run_pipeline, _build_plan
+from tools.genai_client import get_client
+from tools.asset_cache import AssetCache
+from tools.response_cache import ResponseCache
+from tools.ffmpeg_render import set_max_concurrent_jobs, max_concurrent_jobs, DEFAULT_PROFILE
+from tools.tracing import submit
+
+VARIANT_KEYS = ("age", "difficulty", "theme", "duration_sec")
+SUMMARY_NAME = "variants.json"
+
+class DedupingClient:
+    def __init__(self, inner):
+        self.inner = inner
+        self.calls = {"text": 0, "image": 0, "audio": 0}
+        self.shared = {"text": 0, "image": 0, "audio": 0}
+        self._results = {}
+        self._lock = threading.Lock()
+
+    def _once(self, kind: str, key: tuple, call):
+        with self._lock:
+            fut = self._results.get((kind, key))
+            owner = fut is None
+            if owner:
+                fut = self._results[(kind, key)] = Future()
+                self.calls[kind] += 1
+            else:
+                self.shared[kind] += 1
+        if owner:
+            try:
+                fut.set_result(call())
+            except Exception as e:
+                with self._lock:
+                    self._results.pop((kind, key), None)
+                fut.set_exception(e)
+        return fut.result()
+
+    def generate_text(self, system: str, user: str, **kw):
+        key = (system, user, kw.get("model"), getattr(kw.get("response_schema"), "__name__", None))
+        return self._once("text", key, lambda: self.inner.generate_text(system=system, user=user, **kw))
+
+    def generate_text_stream(self, system: str, user: str, **kw):
+        with self._lock:
+            self.calls["text"] += 1
+        return self.inner.generate_text_stream(system=system, user=user, **kw)
+
+    def generate_image(self, prompt: str, **kw):
+        return self._once("image", (prompt, kw.get("model")), lambda: self.inner.generate_image(prompt=prompt, **kw))
+
+    def generate_audio(self, text: str):
+        return self._once("audio", (text,), lambda: self.inner.generate_audio(text=text))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"calls": dict(self.calls), "shared": dict(self.shared)}
+
+def variant_id(v: dict) -> str:
+    return f"age{v['age']}_d{v['difficulty']}_{v['duration_sec']}s_" + "".join(c if c.isalnum() else "-" for c in v["theme"].lower())[:24]
+
+def _normalize(v: dict) -> dict:
+    missing = [k for k in VARIANT_KEYS if k not in v and not (k == "duration_sec" and "duration" in v)]
+    if missing:
+        raise ValueError(f"Variant missing {', '.join(missing)}")
+    return {
+        "age": int(v["age"]),
+        "difficulty": int(v["difficulty"]),
+        "theme": str(v["theme"]),
+        "duration_sec": int(v.get("duration_sec", v.get("duration")))
+    }
+
+def _plan_group(v: dict) -> tuple:
+    return (v["age"], v["difficulty"], v["duration_sec"])
+
+def run_variants(user_prompt: str, variants: list, out_root: str, gen_images: bool, gen_audio: bool, burn_subs: bool, api_key: str, max_variants: int = None, render_jobs: int = None, cache_dir: str = None, fresh: bool = False, render_profile: str = DEFAULT_PROFILE, genai_client=None, asset_cache=None, response_cache=None, **options) -> dict:
+    started_at = time.perf_counter()
+    variants = [_normalize(v) for v in variants]
+    if not variants:
+        raise ValueError("No variants given")
+    os.makedirs(out_root, exist_ok=True)
+    client = DedupingClient(genai_client or get_client(api_key))
+    if asset_cache is None and cache_dir:
+        asset_cache = AssetCache(os.path.join(cache_dir, "assets"))
+    if response_cache is None and cache_dir:
+        response_cache = ResponseCache(os.path.join(cache_dir, "responses.sqlite"))
+    previous_jobs = max_concurrent_jobs()
+    limit_jobs = bool(render_jobs) or previous_jobs is None
+    if limit_jobs:
+        set_max_concurrent_jobs(render_jobs or os.cpu_count() or 1)
+
+    try:
+        groups = {}
+        for v in variants:
+            groups.setdefault(_plan_group(v), []).append(v)
+        workers = max(1, min(len(variants), max_variants or len(variants)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            plan_futs = {
+                key: submit(pool, _build_plan, client, user_prompt, vs[0]["age"], vs[0]["difficulty"], vs[0]["duration_sec"], vs[0]["theme"], cache=response_cache, fresh=fresh, neutral=len({v["theme"] for v in vs}) > 1)
+                for key, vs in groups.items()
+            }
+            plans = {key: f.result() for key, f in plan_futs.items()}
+
+            def run_one(v: dict) -> dict:
+                out_dir = os.path.join(out_root, variant_id(v))
+                record = {**v, "out_dir": out_dir}
+                try:
+                    result = run_pipeline(
+                        user_prompt=user_prompt, out_dir=out_dir, gen_images=gen_images, gen_audio=gen_audio, burn_subs=burn_subs,
+                        api_key=api_key, fresh=fresh, render_profile=render_profile, genai_client=client,
+                        asset_cache=asset_cache, response_cache=response_cache, plan=plans[_plan_group(v)], **v, **options
+                    )
+                    record.update(status="ok", final_video_path=result.get("final_video_path"), render_error=result.get("render_error"), total_sec=result.get("total_sec"))
+                except Exception as e:
+                    record.update(status="error", error=f"{type(e).__name__}: {e}"[:2000])
+                return record
+
+            records = [f.result() for f in [submit(pool, run_one, v) for v in variants]]
+    finally:
+        if limit_jobs:
+            set_max_concurrent_jobs(previous_jobs)
+
+    stats = client.stats()
+    plans_saved = len(variants) - len(groups)
+    made = sum(stats["calls"].values())
+    saved = plans_saved + sum(stats["shared"].values())
+    summary = {
+        "user_prompt": user_prompt,
+        "variants": records,
+        "plans": len(groups),
+        "api_calls": stats["calls"],
+        "saved": {
+            "plans": plans_saved,
+            "text": stats["shared"]["text"],
+            "image": stats["shared"]["image"],
+            "audio": stats["shared"]["audio"],
+            "asset_cache_hits": asset_cache.stats()["hits"] if asset_cache else 0
+        },
+        "saved_ratio": round(saved / (made + saved), 3) if made + saved else None,
+        "wall_sec": round(time.perf_counter() - started_at, 3)
+    }
+    with open(os.path.join(out_root, SUMMARY_NAME), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    return summary
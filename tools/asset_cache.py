@@ -0,0 +1,124 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+def write_atomic(path: str, data: bytes):
+    d = os.path.dirname(path) or "."
+    os.makedirs(d, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=d, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def file_digest(path: str):
+    if not path or not os.path.exists(path):
+        return None
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _link_or_copy(src: str, dest: str):
+    d = os.path.dirname(dest) or "."
+    tmp = os.path.join(d, f".tmp-{os.getpid()}-{threading.get_ident()}-{os.path.basename(dest)}")
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dest)
+
+class AssetCache:
+    def __init__(self, root: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = int(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._total = sum(size for _, size, _ in self._entries())
+
+    @staticmethod
+    def key(model: str, prompt: str, *style) -> str:
+        payload = json.dumps([model, prompt, list(style)], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str, ext: str) -> str:
+        return os.path.join(self.root, key[:2], key + ext)
+
+    def _entries(self) -> list:
+        entries = []
+        for dirpath, _, files in os.walk(self.root):
+            for name in files:
+                if name.startswith(".tmp-"):
+                    continue
+                p = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(p)
+                except FileNotFoundError:
+                    continue
+                entries.append((p, st.st_size, st.st_mtime))
+        return entries
+
+    def fetch(self, key: str, ext: str, dest: str) -> bool:
+        src = self._path(key, ext)
+        try:
+            _link_or_copy(src, dest)
+            os.utime(src)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return False
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def store(self, key: str, ext: str, data: bytes, dest: str = None) -> str:
+        path = self._path(key, ext)
+        with self._lock:
+            try:
+                old = os.path.getsize(path)
+            except FileNotFoundError:
+                old = 0
+            write_atomic(path, data)
+            self._total += len(data) - old
+            over = self._total > self.max_bytes
+        if dest:
+            _link_or_copy(path, dest)
+        if over:
+            self.evict()
+        return path
+
+    def evict(self):
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda e: e[2])
+            total = sum(size for _, size, _ in entries)
+            for p, size, _ in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(p)
+                except FileNotFoundError:
+                    pass
+                total -= size
+            self._total = total
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+                "bytes": self._total
+            }
@@ -1,25 +1,110 @@
 import os
 import subprocess
 import shlex
+import threading
+from contextlib import nullcontext
+from tools.tracing import span
+from tools.metrics import counter, gauge, histogram
 
-def _run(cmd: str):
-    p = subprocess.run(cmd, shell=True, capture_output=True, text=True)
+PLACEHOLDER_COLOR = "0xf5f5f5"
+
+RENDER_PROFILES = {
+    "draft": {"width": 640, "height": 360, "fps": 12, "preset": "ultrafast", "crf": 30, "tune": "stillimage", "zoom": False},
+    "standard": {"width": 1280, "height": 720, "fps": 30, "preset": "medium", "crf": 23, "tune": None, "zoom": True},
+    "final": {"width": 1920, "height": 1080, "fps": 30, "preset": "slow", "crf": 18, "tune": None, "zoom": True}
+}
+DEFAULT_PROFILE = "standard"
+
+FFMPEG_RUNS = counter("unfold_ffmpeg_runs_total", "FFmpeg invocations by step and outcome", ("label", "status"))
+FFMPEG_SECONDS = histogram("unfold_ffmpeg_seconds", "FFmpeg wall time per invocation (render_scene_video is one scene)", ("label",))
+FFMPEG_WAITING = gauge("unfold_ffmpeg_waiting", "FFmpeg jobs waiting for a render slot")
+FFMPEG_RUNNING = gauge("unfold_ffmpeg_running", "FFmpeg jobs currently running")
+
+_job_slots = None
+_job_limit = None
+
+def set_max_concurrent_jobs(limit: int):
+    global _job_slots, _job_limit
+    if limit and limit > 0:
+        _job_slots = threading.BoundedSemaphore(limit)
+        _job_limit = limit
+    else:
+        _job_slots = None
+        _job_limit = None
+
+def max_concurrent_jobs() -> int:
+    return _job_limit
+
+def _job_slot():
+    return _job_slots if _job_slots is not None else nullcontext()
+
+def run_ffmpeg(cmd: str, label: str = "ffmpeg", out_path: str = None):
+    FFMPEG_WAITING.inc()
+    with _job_slot():
+        FFMPEG_WAITING.dec()
+        with FFMPEG_RUNNING.track(), FFMPEG_SECONDS.time(label=label), span(f"ffmpeg.{label}", out=os.path.basename(out_path) if out_path else None):
+            p = subprocess.run(cmd, shell=True, capture_output=True, text=True)
+    FFMPEG_RUNS.inc(label=label, status="ok" if p.returncode == 0 else "error")
     if p.returncode != 0:
         raise RuntimeError(p.stderr.strip() or p.stdout.strip() or "ffmpeg error")
 
-def render_scene_video(image_path: str, audio_path: str, duration_sec: int, out_path: str):
-    fps = 30
-    frames = max(1, int(duration_sec * fps))
-    vf = f"scale=1280:720,zoompan=z='min(zoom+0.0008,1.12)':d={frames}:s=1280x720:fps={fps}"
+def render_slots(n_jobs: int, max_jobs: int = None) -> tuple:
+    cpus = os.cpu_count() or 1
+    workers = max(1, min(n_jobs, max_jobs or cpus, cpus))
+    threads = max(1, cpus // min(workers, _job_limit or workers))
+    return workers, threads
+
+def render_profile(name: str = None) -> dict:
+    name = name or DEFAULT_PROFILE
+    if name not in RENDER_PROFILES:
+        raise ValueError(f"Unknown render profile: {name}")
+    return RENDER_PROFILES[name]
+
+def _size(prof: dict) -> str:
+    return f"{prof['width']}x{prof['height']}"
+
+def _video_codec(prof: dict) -> str:
+    tune = f"-tune {prof['tune']} " if prof.get("tune") else ""
+    return f"-c:v libx264 -preset {prof['preset']} -crf {prof['crf']} {tune}-pix_fmt yuv420p"
+
+def _image_filter(prof: dict, duration_sec: int) -> str:
+    scale = f"scale={prof['width']}:{prof['height']}"
+    if not prof["zoom"]:
+        return f"{scale},setsar=1"
+    frames = max(1, int(duration_sec * prof["fps"]))
+    return f"{scale},zoompan=z='min(zoom+0.0008,1.12)':d={frames}:s={_size(prof)}:fps={prof['fps']},setsar=1"
+
+def _image_input(image_path: str, duration_sec: int, prof: dict, loop: bool = True) -> str:
+    fps = prof["fps"]
+    if not image_path:
+        return f"-f lavfi -t {duration_sec} -i color=c={PLACEHOLDER_COLOR}:s={_size(prof)}:r={fps}"
+    if loop:
+        rate = "" if prof["zoom"] else "-framerate 1 "
+        return f"-loop 1 {rate}-t {duration_sec} -i {shlex.quote(image_path)}"
+    return f"-i {shlex.quote(image_path)}"
+
+def audio_fit(duration_sec: int) -> str:
+    return f"aformat=sample_rates=44100:channel_layouts=stereo,apad,atrim=duration={duration_sec}"
+
+def _audio_input(audio_path: str, duration_sec: int) -> str:
+    if not audio_path:
+        return f"-f lavfi -t {duration_sec} -i anullsrc=r=22050:cl=mono"
+    return f"-i {shlex.quote(audio_path)}"
+
+def render_scene_video(image_path: str, audio_path: str, duration_sec: int, out_path: str, threads: int = 0, profile: str = None):
+    prof = render_profile(profile)
+    vf = _image_filter(prof, duration_sec) if image_path else "setsar=1"
+    thread_opts = f"-threads {threads} -filter_threads {threads} " if threads > 0 else ""
     cmd = (
         f"ffmpeg -y -hide_banner -loglevel error "
-        f"-loop 1 -t {duration_sec} -i {shlex.quote(image_path)} "
-        f"-i {shlex.quote(audio_path)} "
-        f"-vf {shlex.quote(vf)} -r {fps} "
-        f"-c:v libx264 -pix_fmt yuv420p -c:a aac -shortest "
+        f"{_image_input(image_path, duration_sec, prof)} "
+        f"{_audio_input(audio_path, duration_sec)} "
+        f"-vf {shlex.quote(vf)} -af {shlex.quote(audio_fit(duration_sec))} -r {prof['fps']} "
+        f"{_video_codec(prof)} -c:a aac -t {duration_sec} "
+        f"{thread_opts}"
         f"{shlex.quote(out_path)}"
     )
-    _run(cmd)
+    run_ffmpeg(cmd, "render_scene_video", out_path)
 
 def concat_videos(video_paths: list, out_path: str):
     base = os.path.dirname(out_path)
@@ -32,14 +117,67 @@ def concat_videos(video_paths: list, out_path: str):
         f"-f concat -safe 0 -i {shlex.quote(lst)} "
         f"-c copy {shlex.quote(out_path)}"
     )
-    _run(cmd)
+    run_ffmpeg(cmd, "concat_videos", out_path)
 
-def burn_subtitles(video_in: str, srt_path: str, video_out: str):
+def burn_subtitles(video_in: str, srt_path: str, video_out: str, profile: str = None):
     vf = f"subtitles={srt_path}"
     cmd = (
         f"ffmpeg -y -hide_banner -loglevel error "
         f"-i {shlex.quote(video_in)} "
         f"-vf {shlex.quote(vf)} "
-        f"-c:a copy {shlex.quote(video_out)}"
+        f"{_video_codec(render_profile(profile))} -c:a copy {shlex.quote(video_out)}"
+    )
+    run_ffmpeg(cmd, "burn_subtitles", video_out)
+
+def mux_soft_subtitles(video_in: str, srt_path: str, video_out: str):
+    cmd = (
+        f"ffmpeg -y -hide_banner -loglevel error "
+        f"-i {shlex.quote(video_in)} -i {shlex.quote(srt_path)} "
+        f"-map 0:v -map 0:a? -map 1:s "
+        f"-c copy -c:s mov_text -metadata:s:s:0 language=eng "
+        f"{shlex.quote(video_out)}"
+    )
+    run_ffmpeg(cmd, "mux_soft_subtitles", video_out)
+
+def _filter_path(path: str) -> str:
+    return "'" + path.replace("\\", "/").replace("'", "'\\''") + "'"
+
+def render_lesson(scenes: list, out_path: str, burn_srt: str = None, soft_srt: str = None, threads: int = 0, profile: str = None):
+    prof = render_profile(profile)
+    fps = prof["fps"]
+    inputs = []
+    filters = []
+    pads = []
+    for i, s in enumerate(scenes):
+        dur = int(s.get("target_duration_sec", 10))
+        image_path = s.get("image_path")
+        inputs.append(f"{_image_input(image_path, dur, prof, loop=not prof['zoom'])} {_audio_input(s.get('audio_path'), dur)}")
+        if image_path:
+            filters.append(f"[{2 * i}:v]{_image_filter(prof, dur)},format=yuv420p[v{i}]")
+        else:
+            filters.append(f"[{2 * i}:v]setsar=1,format=yuv420p[v{i}]")
+        filters.append(
+            f"[{2 * i + 1}:a]{audio_fit(dur)},asetpts=PTS-STARTPTS[a{i}]"
+        )
+        pads.append(f"[v{i}][a{i}]")
+    filters.append(f"{''.join(pads)}concat=n={len(scenes)}:v=1:a=1[vcat][aout]")
+    if burn_srt:
+        filters.append(f"[vcat]subtitles={_filter_path(burn_srt)}[vout]")
+    else:
+        filters.append("[vcat]null[vout]")
+
+    sub_opts = ""
+    if soft_srt:
+        inputs.append(f"-i {shlex.quote(soft_srt)}")
+        sub_opts = f"-map {2 * len(scenes)}:s -c:s mov_text -metadata:s:s:0 language=eng "
+    thread_opts = f"-threads {threads} -filter_threads {threads} " if threads > 0 else ""
+    cmd = (
+        f"ffmpeg -y -hide_banner -loglevel error "
+        f"{' '.join(inputs)} "
+        f"-filter_complex {shlex.quote(';'.join(filters))} "
+        f"-map [vout] -map [aout] {sub_opts}"
+        f"-r {fps} {_video_codec(prof)} -c:a aac "
+        f"{thread_opts}"
+        f"{shlex.quote(out_path)}"
     )
-    _run(cmd)
+    run_ffmpeg(cmd, "render_lesson", out_path)
@@ -1,39 +1,270 @@
+import os
+import time
 import base64
+import random
+import asyncio
+import threading
+from contextlib import nullcontext
+import httpx
 from google import genai
+from google.genai import types, errors
+from tools.tracing import span, event
+from tools.metrics import counter, gauge, histogram
+
+TEXT_MODEL = "gemini-2.5-flash"
+IMAGE_MODEL = "imagen-3.0-generate-002"
+AUDIO_MODEL = "gemini-2.5-flash"
+AUDIO_INSTRUCTION = "Generate speech audio for this kid-safe narration:"
+
+RATE_LIMITS = {"text": (60, 10), "image": (30, 8), "audio": (60, 8)}
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+MAX_ATTEMPTS = 5
+BACKOFF_BASE_SEC = 0.5
+BACKOFF_MAX_SEC = 16.0
+DEADLINE_SEC = {"text": 120.0, "image": 90.0, "audio": 120.0}
+BASE_URL_ENV = "UNFOLD_GENAI_BASE_URL"
+SLOT_POLL_SEC = 0.01
+
+GENAI_REQUESTS = counter("unfold_genai_requests_total", "GenAI API attempts by endpoint, model and outcome", ("endpoint", "model", "status"))
+GENAI_LATENCY = histogram("unfold_genai_request_seconds", "GenAI API attempt latency", ("endpoint", "model"))
+GENAI_RETRIES = counter("unfold_genai_retries_total", "GenAI API attempts retried after a transient error", ("endpoint",))
+GENAI_THROTTLED = counter("unfold_genai_throttle_seconds_total", "Seconds spent waiting on the client-side rate limiter", ("endpoint",))
+GENAI_IN_FLIGHT = gauge("unfold_genai_in_flight", "GenAI API calls currently in flight", ("endpoint",))
+
+_api_slots = None
+
+def set_api_concurrency(limit: int):
+    global _api_slots
+    _api_slots = threading.BoundedSemaphore(limit) if limit and limit > 0 else None
+
+def _api_slot():
+    return _api_slots if _api_slots is not None else nullcontext()
+
+async def _acquire_slot(slot):
+    while not slot.acquire(blocking=False):
+        await asyncio.sleep(SLOT_POLL_SEC)
+
+class TokenBucket:
+    def __init__(self, per_minute: float, burst: int):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1, int(burst))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait: float = None) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            wait = 0.0 if self.tokens >= 1.0 else (1.0 - self.tokens) / self.rate
+            if max_wait is not None and wait > max_wait:
+                return None
+            self.tokens -= 1.0
+            return wait
+
+_buckets = {name: TokenBucket(*limits) for name, limits in RATE_LIMITS.items()}
+
+def set_rate_limit(endpoint: str, per_minute: float, burst: int = None):
+    if per_minute and per_minute > 0:
+        _buckets[endpoint] = TokenBucket(per_minute, burst or max(1, int(per_minute // 6)))
+    else:
+        _buckets.pop(endpoint, None)
+
+def _throttle_delay(endpoint: str, deadline: float) -> float:
+    bucket = _buckets.get(endpoint)
+    delay = bucket.reserve(max_wait=deadline - time.monotonic()) if bucket is not None else 0.0
+    if delay is None:
+        raise TimeoutError(f"Rate limit wait for {endpoint} exceeds the request deadline")
+    if delay:
+        GENAI_THROTTLED.inc(delay, endpoint=endpoint)
+    return delay
+
+def _retry_delay(e: Exception, attempt: int, deadline: float) -> float:
+    if isinstance(e, errors.APIError):
+        retryable = e.code in RETRY_STATUS
+    else:
+        retryable = isinstance(e, (httpx.TransportError, ConnectionError, TimeoutError))
+    if not retryable or attempt + 1 >= MAX_ATTEMPTS:
+        return None
+    delay = random.uniform(0, min(BACKOFF_MAX_SEC, BACKOFF_BASE_SEC * 2 ** attempt))
+    if time.monotonic() + delay >= deadline:
+        return None
+    return delay
+
+def _on_failure(endpoint: str, model: str, started: float, e: Exception, attempt: int, deadline: float, retryable: bool = True) -> float:
+    _observe(endpoint, model, started, e)
+    delay = _retry_delay(e, attempt, deadline) if retryable else None
+    if delay is None:
+        raise e
+    GENAI_RETRIES.inc(endpoint=endpoint)
+    event("genai.retry", endpoint=endpoint, attempt=attempt, delay_sec=round(delay, 3), error=f"{type(e).__name__}: {e}"[:200])
+    return delay
+
+def _observe(endpoint: str, model: str, started: float, error: Exception = None):
+    if error is None:
+        status = "ok"
+    elif isinstance(error, errors.APIError):
+        status = str(error.code)
+    else:
+        status = type(error).__name__
+    GENAI_REQUESTS.inc(endpoint=endpoint, model=model, status=status)
+    GENAI_LATENCY.observe(time.perf_counter() - started, endpoint=endpoint, model=model)
+
+def _http_options(deadline: float) -> types.HttpOptions:
+    return types.HttpOptions(timeout=max(1000, int((deadline - time.monotonic()) * 1000)))
+
+def _text_config(http: types.HttpOptions, response_schema=None) -> types.GenerateContentConfig:
+    if response_schema is None:
+        return types.GenerateContentConfig(http_options=http)
+    return types.GenerateContentConfig(http_options=http, response_mime_type="application/json", response_schema=response_schema)
+
+def _prompt(system: str, user: str) -> list:
+    return [{"role": "user", "parts": [{"text": f"System:\n{system}\n\nUser:\n{user}"}]}]
+
+def _text(resp) -> str:
+    text = getattr(resp, "text", None)
+    if not text:
+        raise RuntimeError("No text returned")
+    return text.strip()
+
+def _image_bytes(resp) -> bytes:
+    images = getattr(resp, "generated_images", None)
+    if not images:
+        raise RuntimeError("No image returned")
+    return images[0].image.image_bytes
+
+def _audio_bytes(resp):
+    cand = resp.candidates[0]
+    parts = cand.content.parts
+    for p in parts:
+        if hasattr(p, "inline_data") and p.inline_data and getattr(p.inline_data, "data", None):
+            data = p.inline_data.data
+            if isinstance(data, (bytes, bytearray)):
+                return bytes(data)
+            try:
+                return base64.b64decode(data)
+            except Exception:
+                return None
+    return None
 
 class GenAIClient:
-    def __init__(self, api_key: str):
-        self.client = genai.Client(api_key=api_key)
-
-    def generate_text(self, system: str, user: str, model: str = "gemini-2.5-flash"):
-        resp = self.client.models.generate_content(
-            model=model,
-            contents=[{"role": "user", "parts": [{"text": f"System:\n{system}\n\nUser:\n{user}"}]}]
-        )
-        text = getattr(resp, "text", None)
-        if not text:
-            raise RuntimeError("No text returned")
-        return text.strip()
-
-    def generate_image(self, prompt: str, model: str = "imagen-3.0-generate-002"):
-        resp = self.client.models.generate_images(model=model, prompt=prompt)
-        images = getattr(resp, "generated_images", None)
-        if not images:
-            raise RuntimeError("No image returned")
-        return images[0].image.image_bytes
+    def __init__(self, api_key: str, base_url: str = None, vertexai: bool = None):
+        http = types.HttpOptions(base_url=base_url) if base_url else None
+        self.client = genai.Client(api_key=api_key, http_options=http, vertexai=vertexai)
+
+    def _call(self, endpoint: str, name: str, model: str, request):
+        deadline = time.monotonic() + DEADLINE_SEC[endpoint]
+        attempt = 0
+        while True:
+            delay = _throttle_delay(endpoint, deadline)
+            if delay:
+                time.sleep(delay)
+            started = time.perf_counter()
+            try:
+                with _api_slot(), GENAI_IN_FLIGHT.track(endpoint=endpoint), span(name, model=model, attempt=attempt):
+                    resp = request(_http_options(deadline))
+                _observe(endpoint, model, started)
+                return resp
+            except Exception as e:
+                time.sleep(_on_failure(endpoint, model, started, e, attempt, deadline))
+                attempt += 1
+
+    async def _acall(self, endpoint: str, name: str, model: str, request):
+        deadline = time.monotonic() + DEADLINE_SEC[endpoint]
+        attempt = 0
+        while True:
+            delay = _throttle_delay(endpoint, deadline)
+            if delay:
+                await asyncio.sleep(delay)
+            slot = _api_slots
+            if slot is not None:
+                await _acquire_slot(slot)
+            started = time.perf_counter()
+            try:
+                with GENAI_IN_FLIGHT.track(endpoint=endpoint), span(name, model=model, attempt=attempt):
+                    resp = await request(_http_options(deadline))
+                _observe(endpoint, model, started)
+                return resp
+            except Exception as e:
+                delay = _on_failure(endpoint, model, started, e, attempt, deadline)
+            finally:
+                if slot is not None:
+                    slot.release()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def generate_text(self, system: str, user: str, model: str = TEXT_MODEL, response_schema=None):
+        resp = self._call("text", "genai.generate_text", model, lambda http: self.client.models.generate_content(
+            model=model, contents=_prompt(system, user), config=_text_config(http, response_schema)
+        ))
+        return _text(resp)
+
+    def generate_text_stream(self, system: str, user: str, model: str = TEXT_MODEL, response_schema=None):
+        deadline = time.monotonic() + DEADLINE_SEC["text"]
+        attempt = 0
+        while True:
+            delay = _throttle_delay("text", deadline)
+            if delay:
+                time.sleep(delay)
+            emitted = False
+            started = time.perf_counter()
+            try:
+                with _api_slot(), GENAI_IN_FLIGHT.track(endpoint="text"), span("genai.generate_text_stream", model=model, attempt=attempt):
+                    stream = self.client.models.generate_content_stream(
+                        model=model, contents=_prompt(system, user),
+                        config=_text_config(_http_options(deadline), response_schema)
+                    )
+                    for chunk in stream:
+                        text = getattr(chunk, "text", None)
+                        if text:
+                            emitted = True
+                            yield text
+                _observe("text", model, started)
+                return
+            except Exception as e:
+                time.sleep(_on_failure("text", model, started, e, attempt, deadline, retryable=not emitted))
+                attempt += 1
+
+    def generate_image(self, prompt: str, model: str = IMAGE_MODEL):
+        resp = self._call("image", "genai.generate_image", model, lambda http: self.client.models.generate_images(
+            model=model, prompt=prompt, config=types.GenerateImagesConfig(http_options=http)
+        ))
+        return _image_bytes(resp)
 
     def generate_audio(self, text: str):
-        resp = self.client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=[{"role": "user", "parts": [{"text": f"Generate speech audio for this kid-safe narration:\n{text}"}]}]
-        )
-        cand = resp.candidates[0]
-        parts = cand.content.parts
-        for p in parts:
-            if hasattr(p, "inline_data") and p.inline_data and getattr(p.inline_data, "data", None):
-                data = p.inline_data.data
-                try:
-                    return base64.b64decode(data)
-                except Exception:
-                    return None
-        return None
+        resp = self._call("audio", "genai.generate_audio", AUDIO_MODEL, lambda http: self.client.models.generate_content(
+            model=AUDIO_MODEL, contents=[{"role": "user", "parts": [{"text": f"{AUDIO_INSTRUCTION}\n{text}"}]}],
+            config=types.GenerateContentConfig(http_options=http)
+        ))
+        return _audio_bytes(resp)
+
+    async def agenerate_text(self, system: str, user: str, model: str = TEXT_MODEL, response_schema=None):
+        resp = await self._acall("text", "genai.generate_text", model, lambda http: self.client.aio.models.generate_content(
+            model=model, contents=_prompt(system, user), config=_text_config(http, response_schema)
+        ))
+        return _text(resp)
+
+    async def agenerate_image(self, prompt: str, model: str = IMAGE_MODEL):
+        resp = await self._acall("image", "genai.generate_image", model, lambda http: self.client.aio.models.generate_images(
+            model=model, prompt=prompt, config=types.GenerateImagesConfig(http_options=http)
+        ))
+        return _image_bytes(resp)
+
+    async def agenerate_audio(self, text: str):
+        resp = await self._acall("audio", "genai.generate_audio", AUDIO_MODEL, lambda http: self.client.aio.models.generate_content(
+            model=AUDIO_MODEL, contents=[{"role": "user", "parts": [{"text": f"{AUDIO_INSTRUCTION}\n{text}"}]}],
+            config=types.GenerateContentConfig(http_options=http)
+        ))
+        return _audio_bytes(resp)
+
+_pool = {}
+_pool_lock = threading.Lock()
+
+def get_client(api_key: str, base_url: str = None, vertexai: bool = None) -> GenAIClient:
+    base_url = base_url or os.getenv(BASE_URL_ENV) or None
+    with _pool_lock:
+        client = _pool.get((api_key, base_url, vertexai))
+        if client is None:
+            client = _pool[(api_key, base_url, vertexai)] = GenAIClient(api_key=api_key, base_url=base_url, vertexai=vertexai)
+        return client
@@ -0,0 +1,99 @@
+import os
+import math
+import shlex
+import threading
+from tools.ffmpeg_render import run_ffmpeg
+from tools.asset_cache import write_atomic
+from tools.tracing import event
+
+HLS_DIR = "hls"
+PLAYLIST_NAME = "lesson.m3u8"
+SEGMENT_SEC = 4
+
+def read_segments(playlist_path: str) -> tuple:
+    init = None
+    segments = []
+    duration = None
+    with open(playlist_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("#EXT-X-MAP:"):
+                init = line.split('URI="', 1)[1].split('"', 1)[0]
+            elif line.startswith("#EXTINF:"):
+                duration = float(line[len("#EXTINF:"):].split(",", 1)[0])
+            elif line and not line.startswith("#") and duration is not None:
+                segments.append((duration, line))
+                duration = None
+    return init, segments
+
+def segment_video(video_path: str, hls_dir: str, name: str) -> tuple:
+    playlist = os.path.join(hls_dir, f"{name}.m3u8")
+    cmd = (
+        f"ffmpeg -y -hide_banner -loglevel error "
+        f"-i {shlex.quote(video_path)} -c copy "
+        f"-f hls -hls_time {SEGMENT_SEC} -hls_playlist_type vod -hls_segment_type fmp4 "
+        f"-hls_fmp4_init_filename {shlex.quote(name + '_init.mp4')} "
+        f"-hls_segment_filename {shlex.quote(os.path.join(hls_dir, name + '_%03d.m4s'))} "
+        f"{shlex.quote(playlist)}"
+    )
+    run_ffmpeg(cmd, "hls_segment", playlist)
+    return read_segments(playlist)
+
+class HlsPlaylist:
+    def __init__(self, out_dir: str, target_duration: float = SEGMENT_SEC):
+        self.dir = os.path.join(out_dir, HLS_DIR)
+        self.path = os.path.join(self.dir, PLAYLIST_NAME)
+        self.target = max(1, int(math.ceil(target_duration)))
+        self.pending = {}
+        self.published = []
+        self.ended = False
+        self._lock = threading.Lock()
+        os.makedirs(self.dir, exist_ok=True)
+        self._write()
+
+    def add(self, position: int, video_path: str):
+        name = os.path.splitext(os.path.basename(video_path))[0]
+        try:
+            segments = segment_video(video_path, self.dir, name)
+        except Exception as e:
+            event("error.hls", video=name, error=f"{type(e).__name__}: {e}"[:500])
+            segments = (None, [])
+        with self._lock:
+            self.pending[position] = segments
+            while len(self.published) in self.pending:
+                self.published.append(self.pending.pop(len(self.published)))
+            self._write()
+
+    def finish(self):
+        with self._lock:
+            for position in sorted(self.pending):
+                self.published.append(self.pending.pop(position))
+            self.ended = True
+            self._write()
+
+    def _write(self):
+        durations = [d for _, segs in self.published for d, _ in segs]
+        if durations:
+            self.target = max(self.target, int(math.ceil(max(durations))))
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:7",
+            f"#EXT-X-TARGETDURATION:{self.target}",
+            "#EXT-X-MEDIA-SEQUENCE:0",
+            "#EXT-X-PLAYLIST-TYPE:EVENT"
+        ]
+        first = True
+        for init, segs in self.published:
+            if not segs:
+                continue
+            if not first:
+                lines.append("#EXT-X-DISCONTINUITY")
+            first = False
+            if init:
+                lines.append(f'#EXT-X-MAP:URI="{init}"')
+            for duration, name in segs:
+                lines.append(f"#EXTINF:{duration:.3f},")
+                lines.append(name)
+        if self.ended:
+            lines.append("#EXT-X-ENDLIST")
+        write_atomic(self.path, ("\n".join(lines) + "\n").encode("utf-8"))
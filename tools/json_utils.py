@@ -38,3 +38,59 @@ def extract_json(text: str):
                     chunk = t[start:i+1]
                     return json.loads(chunk)
     raise ValueError("Unclosed JSON object")
+
+class ArrayItemParser:
+    def __init__(self, key: str = "scenes"):
+        self.key = key
+        self.text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_str = False
+        self._esc = False
+        self._str_start = None
+        self._last_str = None
+        self._current_key = None
+        self._array_depth = None
+        self._item_start = None
+        self.done = False
+
+    def feed(self, chunk: str) -> list:
+        self.text += chunk or ""
+        items = []
+        t = self.text
+        for i in range(self._pos, len(t)):
+            c = t[i]
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif c == "\\":
+                    self._esc = True
+                elif c == '"':
+                    self._in_str = False
+                    self._last_str = t[self._str_start + 1:i]
+                continue
+            if c == '"':
+                self._in_str = True
+                self._str_start = i
+            elif c == ":":
+                if self._depth == 1:
+                    self._current_key = self._last_str
+            elif c == ",":
+                if self._depth == 1:
+                    self._current_key = None
+            elif c in "{[":
+                self._depth += 1
+                if c == "[" and self._depth == 2 and self._array_depth is None and not self.done and self._current_key == self.key:
+                    self._array_depth = 2
+                elif c == "{" and self._array_depth is not None and self._depth == self._array_depth + 1:
+                    self._item_start = i
+            elif c in "}]":
+                if c == "}" and self._item_start is not None and self._depth == self._array_depth + 1:
+                    items.append(json.loads(t[self._item_start:i + 1]))
+                    self._item_start = None
+                self._depth -= 1
+                if self._array_depth is not None and self._depth < self._array_depth:
+                    self._array_depth = None
+                    self.done = True
+        self._pos = len(t)
+        return items
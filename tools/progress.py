@@ -0,0 +1,20 @@
+import contextvars
+from contextlib import contextmanager
+
+_current = contextvars.ContextVar("unfold_progress", default=None)
+
+@contextmanager
+def reporting(callback):
+    token = _current.set(callback)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+def report(stage: str, status: str, **info):
+    callback = _current.get()
+    if callback is not None:
+        try:
+            callback(stage, status, info)
+        except Exception:
+            pass
@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+from tools.genai_client import TEXT_MODEL
+from tools.metrics import counter
+
+DEFAULT_TTL_SEC = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 5000
+
+CACHE_LOOKUPS = counter("unfold_cache_lookups_total", "Cache lookups by cache and result", ("cache", "result"))
+
+def _canonical(user: str) -> str:
+    try:
+        return json.dumps(json.loads(user), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    except Exception:
+        return user
+
+class ResponseCache:
+    def __init__(self, path: str, ttl_sec: int = DEFAULT_TTL_SEC, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl_sec = ttl_sec
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, text TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed)")
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    @staticmethod
+    def key(model: str, system: str, user: str) -> str:
+        payload = json.dumps([model, system, _canonical(user)], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key: str):
+        now = time.time()
+        with self._connect() as db:
+            row = db.execute("SELECT text, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row and now - row[1] > self.ttl_sec:
+                db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row:
+                db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        self._count(row is not None)
+        return row[0] if row else None
+
+    def put(self, key: str, text: str):
+        now = time.time()
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO responses (key, text, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, text, now, now)
+            )
+            db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_sec,))
+            db.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else None
+            }
+
+def lookup_validated(cache, system: str, user: str, validate, fresh: bool = False) -> tuple:
+    key = cache.key(TEXT_MODEL, system, user) if cache is not None else None
+    if not key or fresh:
+        return key, None
+    text = cache.get(key)
+    CACHE_LOOKUPS.inc(cache="response", result="miss" if text is None else "hit")
+    if text is None:
+        return key, None
+    try:
+        return key, validate(text)
+    except Exception:
+        return key, None
+
+def generate_validated(genai_client, system: str, user: str, validate, cache=None, fresh: bool = False, response_schema=None, repair=None):
+    key, data = lookup_validated(cache, system, user, validate, fresh=fresh)
+    if data is not None:
+        return repair(data) if repair is not None else data
+    if response_schema is not None:
+        text = genai_client.generate_text(system=system, user=user, response_schema=response_schema)
+    else:
+        text = genai_client.generate_text(system=system, user=user)
+    data = validate(text)
+    if repair is not None:
+        data = repair(data)
+        text = json.dumps(data, ensure_ascii=False)
+    if key:
+        cache.put(key, text)
+    return data
@@ -0,0 +1,290 @@
+import os
+import sys
+import glob
+import json
+import time
+import shlex
+import shutil
+import argparse
+import threading
+from tools.asset_cache import write_atomic, file_digest
+from tools.env_utils import has_ffmpeg
+from tools.ffmpeg_render import run_ffmpeg
+
+INDEX_NAME = "runs_index.json"
+RUN_PREFIX = "run_"
+INTERMEDIATE_PATTERNS = ("joined.mp4", "concat_list.txt")
+SEGMENT_PATTERNS = ("scene_*.mp4",)
+DEDUP_EXTS = (".png", ".wav")
+UNFINISHED_STATES = ("queued", "running")
+
+DEFAULT_POLICY = {"max_age_days": 30.0, "max_total_gb": 20.0, "max_runs": 500, "prune_intermediates": True, "prune_segments": False, "enforce": False}
+FLAG_KEYS = ("prune_intermediates", "prune_segments", "enforce")
+POLICY_ENV = {
+    "max_age_days": "UNFOLD_RETENTION_MAX_AGE_DAYS",
+    "max_total_gb": "UNFOLD_RETENTION_MAX_TOTAL_GB",
+    "max_runs": "UNFOLD_RETENTION_MAX_RUNS",
+    "prune_intermediates": "UNFOLD_PRUNE_INTERMEDIATES",
+    "prune_segments": "UNFOLD_PRUNE_SEGMENTS",
+    "enforce": "UNFOLD_RETENTION_ENFORCE"
+}
+
+_index_lock = threading.Lock()
+
+def retention_policy(**overrides) -> dict:
+    policy = dict(DEFAULT_POLICY)
+    for key, env in POLICY_ENV.items():
+        raw = os.getenv(env, "").strip()
+        if raw:
+            policy[key] = raw.lower() not in ("0", "false", "no") if key in FLAG_KEYS else float(raw)
+    policy.update({k: v for k, v in overrides.items() if v is not None})
+    return policy
+
+def _read_json(path: str):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_json(path: str, data):
+    write_atomic(path, json.dumps(data, indent=2).encode("utf-8"))
+
+def run_bytes(out_dir: str) -> int:
+    total = 0.0
+    for d, _, files in os.walk(out_dir):
+        for name in files:
+            try:
+                st = os.stat(os.path.join(d, name))
+            except OSError:
+                continue
+            total += st.st_size / max(1, st.st_nlink)
+    return int(total)
+
+def verify_video(path: str) -> bool:
+    if not path or not os.path.isfile(path) or os.path.getsize(path) == 0 or not has_ffmpeg():
+        return False
+    try:
+        run_ffmpeg(f"ffmpeg -hide_banner -v error -i {shlex.quote(path)} -map 0 -c copy -f null -", "verify", path)
+    except RuntimeError:
+        return False
+    return True
+
+def prune_intermediates(out_dir: str, segments: bool = False) -> list:
+    result_path = os.path.join(out_dir, "result.json")
+    result = _read_json(result_path)
+    final = (result or {}).get("final_video_path")
+    if not verify_video(final):
+        return []
+    keep = os.path.abspath(final)
+    removed = []
+    for pattern in INTERMEDIATE_PATTERNS + (SEGMENT_PATTERNS if segments else ()):
+        for p in sorted(glob.glob(os.path.join(out_dir, pattern))):
+            if os.path.abspath(p) != keep:
+                os.remove(p)
+                removed.append(os.path.basename(p))
+    if removed:
+        if result.get("joined_video_path") and not os.path.exists(result["joined_video_path"]):
+            result["joined_video_path"] = None
+        result["pruned"] = sorted(set(result.get("pruned") or []) | set(removed))
+        _write_json(result_path, result)
+    return removed
+
+def run_record(out_dir: str) -> dict:
+    status = _read_json(os.path.join(out_dir, "status.json")) or {}
+    result_path = os.path.join(out_dir, "result.json")
+    result = _read_json(result_path) or {}
+    name = os.path.basename(os.path.normpath(out_dir))
+    if status.get("state"):
+        state = status["state"]
+    else:
+        state = "done" if result else "unknown"
+    created = status.get("submitted_at") or (os.path.getmtime(result_path) if result else os.path.getmtime(out_dir))
+    final = result.get("final_video_path")
+    return {
+        "run_id": name[len(RUN_PREFIX):] if name.startswith(RUN_PREFIX) else name,
+        "dir": name,
+        "state": state,
+        "created": round(created, 3),
+        "finished": status.get("finished_at") or (round(os.path.getmtime(result_path), 3) if result else None),
+        "topic": (result.get("plan") or {}).get("topic"),
+        "final_video": os.path.basename(final) if final and os.path.exists(final) else None,
+        "render_error": bool(result.get("render_error")),
+        "pruned": bool(result.get("pruned")),
+        "bytes": run_bytes(out_dir)
+    }
+
+def index_path(root: str) -> str:
+    return os.path.join(root, INDEX_NAME)
+
+def load_index(root: str) -> dict:
+    data = _read_json(index_path(root))
+    if not isinstance(data, dict) or not isinstance(data.get("runs"), dict):
+        return {"runs": {}}
+    return data
+
+def _save_index(root: str, index: dict):
+    index["updated"] = round(time.time(), 3)
+    _write_json(index_path(root), index)
+
+def update_index(root: str, out_dir: str) -> dict:
+    record = run_record(out_dir)
+    with _index_lock:
+        index = load_index(root)
+        index["runs"][record["dir"]] = record
+        _save_index(root, index)
+    return record
+
+def rebuild_index(root: str) -> dict:
+    runs = {}
+    if os.path.isdir(root):
+        for entry in os.scandir(root):
+            if entry.is_dir() and entry.name.startswith(RUN_PREFIX):
+                record = run_record(entry.path)
+                runs[record["dir"]] = record
+    with _index_lock:
+        index = {"runs": runs}
+        _save_index(root, index)
+    return index
+
+def ensure_index(root: str) -> dict:
+    if os.path.exists(index_path(root)):
+        return load_index(root)
+    return rebuild_index(root)
+
+def list_runs(root: str, limit: int = None) -> list:
+    runs = sorted(load_index(root)["runs"].values(), key=lambda r: r["created"], reverse=True)
+    return runs[:limit] if limit else runs
+
+def _expired(record: dict, policy: dict, now: float) -> bool:
+    max_age = policy.get("max_age_days")
+    return bool(max_age) and now - record["created"] > max_age * 86400
+
+def enforce_retention(root: str, policy: dict = None, active: tuple = (), dry_run: bool = False) -> dict:
+    policy = policy or retention_policy()
+    now = time.time()
+    active = {a if a.startswith(RUN_PREFIX) else RUN_PREFIX + a for a in active}
+    with _index_lock:
+        index = load_index(root)
+        runs = sorted(index["runs"].values(), key=lambda r: r["created"])
+        total = sum(r["bytes"] for r in runs)
+        count = len(runs)
+        max_bytes = (policy.get("max_total_gb") or 0) * 1024 ** 3
+        max_runs = int(policy.get("max_runs") or 0)
+        doomed = []
+        for r in runs:
+            if r["dir"] in active or (r["state"] in UNFINISHED_STATES and not _expired(r, policy, now)):
+                continue
+            over = (max_runs and count > max_runs) or (max_bytes and total > max_bytes)
+            if not over and not _expired(r, policy, now):
+                continue
+            doomed.append(r)
+            total -= r["bytes"]
+            count -= 1
+        if not dry_run:
+            for r in doomed:
+                shutil.rmtree(os.path.join(root, r["dir"]), ignore_errors=True)
+                index["runs"].pop(r["dir"], None)
+            if doomed:
+                _save_index(root, index)
+    return {
+        "deleted": [r["dir"] for r in doomed],
+        "freed_bytes": sum(r["bytes"] for r in doomed),
+        "runs": count,
+        "total_bytes": int(total),
+        "dry_run": dry_run
+    }
+
+def dedup_assets(root: str, dry_run: bool = False) -> dict:
+    by_size = {}
+    for d, _, files in os.walk(root):
+        for name in files:
+            if name.endswith(DEDUP_EXTS) and not name.startswith(".tmp-"):
+                p = os.path.join(d, name)
+                st = os.stat(p)
+                by_size.setdefault((st.st_dev, st.st_size), []).append((p, st.st_ino))
+    linked = 0
+    saved = 0
+    touched = set()
+    for (_, size), paths in by_size.items():
+        if len({ino for _, ino in paths}) < 2:
+            continue
+        by_hash = {}
+        for p, ino in paths:
+            by_hash.setdefault(file_digest(p), []).append((p, ino))
+        for group in by_hash.values():
+            inodes = {}
+            for p, ino in group:
+                inodes.setdefault(ino, []).append(p)
+            if len(inodes) < 2:
+                continue
+            keep_ino = max(inodes, key=lambda i: len(inodes[i]))
+            src = inodes[keep_ino][0]
+            for ino, ps in inodes.items():
+                if ino == keep_ino:
+                    continue
+                saved += size
+                for p in ps:
+                    linked += 1
+                    touched.add(os.path.relpath(p, root).split(os.sep)[0])
+                    if not dry_run:
+                        tmp = os.path.join(os.path.dirname(p), f".tmp-dedup-{os.getpid()}-{os.path.basename(p)}")
+                        os.link(src, tmp)
+                        os.replace(tmp, p)
+    if not dry_run and touched:
+        indexed = load_index(root)["runs"]
+        for name in sorted(touched & set(indexed)):
+            update_index(root, os.path.join(root, name))
+    return {"linked": linked, "bytes_saved": saved, "dry_run": dry_run}
+
+def finalize_run(out_dir: str, policy: dict = None, active: tuple = ()) -> dict:
+    policy = policy or retention_policy()
+    root = os.path.dirname(os.path.normpath(out_dir))
+    ensure_index(root)
+    pruned = prune_intermediates(out_dir, segments=policy.get("prune_segments")) if policy.get("prune_intermediates") else []
+    record = update_index(root, out_dir)
+    retention = enforce_retention(root, policy, active=tuple(active) + (record["dir"],)) if policy.get("enforce") else None
+    return {"pruned": pruned, "run": record, "retention": retention}
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Index, deduplicate and expire lesson run directories")
+    ap.add_argument("root", nargs="?", default="outputs", help="folder holding run_<id> directories")
+    ap.add_argument("--rebuild-index", action="store_true", help="rescan run directories into the index")
+    ap.add_argument("--prune", action="store_true", help="delete intermediates of runs whose final video verifies")
+    ap.add_argument("--prune-segments", action="store_true", help="with --prune, also delete scene_XX.mp4 (regenerating a scene then re-encodes every segment)")
+    ap.add_argument("--dedup", action="store_true", help="hardlink identical PNG/WAV assets across runs")
+    ap.add_argument("--enforce", action="store_true", help="delete runs outside the retention policy")
+    ap.add_argument("--max-age-days", type=float, default=None)
+    ap.add_argument("--max-total-gb", type=float, default=None)
+    ap.add_argument("--max-runs", type=int, default=None)
+    ap.add_argument("--dry-run", action="store_true")
+    ap.add_argument("--list", type=int, default=None, metavar="N", help="print the N most recent runs from the index")
+    args = ap.parse_args(argv)
+
+    report = {}
+    if args.rebuild_index:
+        report["indexed"] = len(rebuild_index(args.root)["runs"])
+    else:
+        report["indexed"] = len(ensure_index(args.root)["runs"])
+    if args.prune:
+        pruned = {}
+        for r in list_runs(args.root):
+            if r["state"] not in UNFINISHED_STATES and (args.prune_segments or not r["pruned"]):
+                out_dir = os.path.join(args.root, r["dir"])
+                removed = [] if args.dry_run else prune_intermediates(out_dir, segments=args.prune_segments)
+                if removed:
+                    update_index(args.root, out_dir)
+                    pruned[r["dir"]] = removed
+        report["pruned"] = pruned
+    if args.dedup:
+        report["dedup"] = dedup_assets(args.root, dry_run=args.dry_run)
+    if args.enforce:
+        policy = retention_policy(max_age_days=args.max_age_days, max_total_gb=args.max_total_gb, max_runs=args.max_runs)
+        report["retention"] = enforce_retention(args.root, policy, dry_run=args.dry_run)
+    if args.list:
+        report["runs"] = list_runs(args.root, args.list)
+    print(json.dumps(report, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
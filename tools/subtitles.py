@@ -1,17 +1,16 @@
-def _fmt_time(t: float) -> str:
+def _fmt_time(t: float, sep: str = ",") -> str:
     if t < 0:
         t = 0
     h = int(t // 3600)
     m = int((t % 3600) // 60)
     s = int(t % 60)
     ms = int(round((t - int(t)) * 1000))
-    return f"{h:02d}:{m:02d}:{s:02d},{ms:03d}"
+    return f"{h:02d}:{m:02d}:{s:02d}{sep}{ms:03d}"
 
-def build_srt(script: dict, out_path: str):
+def _cues(script: dict) -> list:
     scenes = script["scenes"]
     t = 0.0
-    lines = []
-    idx = 1
+    cues = []
     for s in scenes:
         dur = float(s.get("target_duration_sec", 10))
         start = t
@@ -21,11 +20,27 @@ def build_srt(script: dict, out_path: str):
             text = (s.get("on_screen_text", "") or "").strip()
         if not text:
             text = " "
+        cues.append((start, end, text))
+        t = end
+    return cues
+
+def build_srt(script: dict, out_path: str):
+    lines = []
+    idx = 1
+    for start, end, text in _cues(script):
         lines.append(str(idx))
         lines.append(f"{_fmt_time(start)} --> {_fmt_time(end)}")
         lines.append(text)
         lines.append("")
         idx += 1
-        t = end
+    with open(out_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines))
+
+def build_vtt(script: dict, out_path: str):
+    lines = ["WEBVTT", ""]
+    for start, end, text in _cues(script):
+        lines.append(f"{_fmt_time(start, '.')} --> {_fmt_time(end, '.')}")
+        lines.append(text)
+        lines.append("")
     with open(out_path, "w", encoding="utf-8") as f:
         f.write("\n".join(lines))
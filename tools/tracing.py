@@ -0,0 +1,120 @@
+import os
+import json
+import time
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from tools.metrics import counter
+
+_current = contextvars.ContextVar("unfold_tracer", default=None)
+
+RECORDED_ERRORS = counter("unfold_recorded_errors_total", "Errors caught and recorded as trace events instead of raised", ("event",))
+
+class Tracer:
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.pid = os.getpid()
+        self.events = []
+        self.threads = {}
+        self._lock = threading.Lock()
+
+    def _now_us(self) -> float:
+        return (time.perf_counter() - self.t0) * 1e6
+
+    def _tid(self) -> int:
+        t = threading.current_thread()
+        self.threads.setdefault(t.ident, t.name)
+        return t.ident
+
+    def add_span(self, name: str, start_us: float, dur_us: float, args: dict):
+        with self._lock:
+            self.events.append({
+                "name": name, "ph": "X", "ts": round(start_us, 1), "dur": round(dur_us, 1),
+                "pid": self.pid, "tid": self._tid(), "args": args
+            })
+
+    def add_event(self, name: str, args: dict):
+        with self._lock:
+            self.events.append({
+                "name": name, "ph": "i", "s": "t", "ts": round(self._now_us(), 1),
+                "pid": self.pid, "tid": self._tid(), "args": args
+            })
+
+    def chrome_trace(self) -> dict:
+        with self._lock:
+            meta = [
+                {"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": name}}
+                for tid, name in self.threads.items()
+            ]
+            return {"traceEvents": meta + list(self.events), "displayTimeUnit": "ms"}
+
+    def write(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f)
+
+    def summary(self) -> dict:
+        spans = {}
+        events = {}
+        errors = []
+        with self._lock:
+            for e in self.events:
+                if e["ph"] == "X":
+                    s = spans.setdefault(e["name"], {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+                    ms = e["dur"] / 1000.0
+                    s["count"] += 1
+                    s["total_ms"] += ms
+                    s["max_ms"] = max(s["max_ms"], ms)
+                    if "error" in e["args"]:
+                        errors.append({"name": e["name"], "error": e["args"]["error"]})
+                else:
+                    events[e["name"]] = events.get(e["name"], 0) + 1
+                    if e["name"].startswith(("error", "fallback")) and e["args"].get("error"):
+                        errors.append({"name": e["name"], "error": e["args"]["error"]})
+        for s in spans.values():
+            s["total_ms"] = round(s["total_ms"], 3)
+            s["max_ms"] = round(s["max_ms"], 3)
+        return {"spans": spans, "events": events, "errors": errors[:50]}
+
+def current_tracer():
+    return _current.get()
+
+@contextmanager
+def activate(tracer: Tracer):
+    token = _current.set(tracer)
+    try:
+        yield tracer
+    finally:
+        _current.reset(token)
+
+def new_trace(fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with activate(Tracer()):
+            return fn(*args, **kwargs)
+    return wrapper
+
+@contextmanager
+def span(name: str, **args):
+    tracer = _current.get()
+    if tracer is None:
+        yield
+        return
+    start = tracer._now_us()
+    try:
+        yield
+    except BaseException as e:
+        args["error"] = f"{type(e).__name__}: {e}"[:500]
+        raise
+    finally:
+        tracer.add_span(name, start, tracer._now_us() - start, args)
+
+def event(name: str, **args):
+    if name.startswith("error."):
+        RECORDED_ERRORS.inc(event=name)
+    tracer = _current.get()
+    if tracer is not None:
+        tracer.add_event(name, args)
+
+def submit(pool, fn, *args, **kwargs):
+    return pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)